@@ -0,0 +1,80 @@
+# analise_fatos.py
+import re
+from historico import estimar_tokens, CARACTERES_POR_TOKEN
+
+# Blocos que a página de fatos insere ao anexar documentos e transcrições
+PADRAO_BLOCO_ANEXO = re.compile(
+    r"\n--- (?:Conteúdo|Transcrição) de '(?P<nome>[^\n]*?)' ---\n.*?\n--- Fim d[oa] (?:Conteúdo|Transcrição) de '(?P=nome)' ---",
+    re.DOTALL)
+
+PROMPT_MAPA = (
+    "Os fatos de um caso foram divididos em {total} partes por excederem o contexto do modelo. "
+    "Esta é a parte {numero} de {total}. Extraia dela, em português e de forma objetiva, os fatos "
+    "relevantes, partes envolvidas, datas, valores, pedidos e questões jurídicas. Não conclua sobre "
+    "o caso como um todo: as outras partes serão analisadas separadamente.\n\n{trecho}"
+)
+PROMPT_REDUCAO = (
+    "Abaixo estão as análises de cada parte dos fatos de um caso, feitas separadamente. "
+    "Consolide-as em uma única análise jurídica do caso, como se tivesse lido os fatos inteiros: "
+    "elimine repetições, concilie informações das diferentes partes e aponte contradições.\n\n{analises}"
+)
+
+
+def segmentos_dos_fatos(texto):
+    """Divide os fatos em trechos livres e blocos de anexos (documentos e transcrições), na ordem."""
+    segmentos = []
+    posicao = 0
+    for bloco in PADRAO_BLOCO_ANEXO.finditer(texto):
+        if texto[posicao:bloco.start()].strip():
+            segmentos.append(texto[posicao:bloco.start()])
+        segmentos.append(bloco.group(0))
+        posicao = bloco.end()
+    if texto[posicao:].strip():
+        segmentos.append(texto[posicao:])
+    return segmentos
+
+
+def _partir_segmento(segmento, max_caracteres):
+    # Segmento maior que uma parte inteira: corta em parágrafos e, em último caso, no meio do texto
+    pedacos = []
+    atual = ""
+    for paragrafo in re.split(r"(?<=\n)(?=\n)", segmento):
+        while len(paragrafo) > max_caracteres:
+            pedacos.append(paragrafo[:max_caracteres])
+            paragrafo = paragrafo[max_caracteres:]
+        if atual and len(atual) + len(paragrafo) > max_caracteres:
+            pedacos.append(atual)
+            atual = ""
+        atual += paragrafo
+    if atual.strip():
+        pedacos.append(atual)
+    return pedacos
+
+
+def dividir_fatos(texto, max_tokens):
+    """
+    Agrupa os segmentos dos fatos em partes de até 'max_tokens' (estimados), sem separar
+    um documento ou transcrição anexado, a menos que ele sozinho exceda o limite.
+    """
+    max_caracteres = max(1, int((max_tokens - estimar_tokens("")) * CARACTERES_POR_TOKEN))
+    partes = []
+    atual = ""
+    for segmento in segmentos_dos_fatos(texto):
+        pedacos = [segmento] if len(segmento) <= max_caracteres else _partir_segmento(segmento, max_caracteres)
+        for pedaco in pedacos:
+            if atual and len(atual) + len(pedaco) > max_caracteres:
+                partes.append(atual.strip())
+                atual = ""
+            atual += pedaco
+    if atual.strip():
+        partes.append(atual.strip())
+    return partes
+
+
+def prompt_mapa(trecho, numero, total):
+    return PROMPT_MAPA.format(trecho=trecho, numero=numero, total=total)
+
+
+def prompt_reducao(analises):
+    return PROMPT_REDUCAO.format(analises="\n\n".join(
+        f"### Parte {numero}\n{analise}" for numero, analise in enumerate(analises, 1)))
@@ -0,0 +1,139 @@
+# audio.py
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from difflib import SequenceMatcher
+
+FFMPEG_BIN = "ffmpeg"
+FFPROBE_BIN = "ffprobe"
+DURACAO_SEGMENTO_S = 600  # 10 min em Opus 24 kbps ≈ 1,8 MB, bem abaixo do limite da Groq
+SOBREPOSICAO_S = 5  # Trecho repetido entre segmentos vizinhos, para não cortar palavras
+JANELA_SILENCIO_S = 30  # Distância máxima do corte ideal para procurar um silêncio
+PALAVRAS_COMPARADAS_NA_EMENDA = 60
+
+# Voz a 16 kHz mono é o que o Whisper usa internamente; acima disso só aumenta o upload
+ARGUMENTOS_OPUS = ["-vn", "-ac", "1", "-ar", "16000", "-c:a", "libopus", "-b:a", "24k", "-application", "voip"]
+FILTRO_REMOVER_SILENCIOS = "silenceremove=stop_periods=-1:stop_duration=1:stop_threshold=-40dB"
+
+PADRAO_FIM_SILENCIO = re.compile(r"silence_end:\s*([\d.]+)\s*\|\s*silence_duration:\s*([\d.]+)")
+
+
+def ffmpeg_disponivel():
+    return shutil.which(FFMPEG_BIN) is not None and shutil.which(FFPROBE_BIN) is not None
+
+
+def _executar(comando):
+    resultado = subprocess.run(comando, capture_output=True, text=True)
+    if resultado.returncode != 0:
+        raise RuntimeError(f"{comando[0]} falhou: {resultado.stderr.strip()[-500:]}")
+    return resultado
+
+
+def duracao_audio(caminho):
+    resultado = _executar([FFPROBE_BIN, "-v", "error", "-show_entries", "format=duration",
+                           "-of", "default=noprint_wrappers=1:nokey=1", caminho])
+    return float(resultado.stdout.strip())
+
+
+def detectar_silencios(caminho, ruido_db=-35, duracao_minima_s=0.5):
+    """Retorna o instante central (em segundos) de cada silêncio encontrado no áudio."""
+    resultado = _executar([FFMPEG_BIN, "-hide_banner", "-nostats", "-i", caminho,
+                           "-af", f"silencedetect=noise={ruido_db}dB:d={duracao_minima_s}", "-f", "null", "-"])
+    return [float(fim) - float(duracao) / 2 for fim, duracao in PADRAO_FIM_SILENCIO.findall(resultado.stderr)]
+
+
+def _nome_opus(nome_original):
+    return os.path.splitext(os.path.basename(nome_original))[0] + ".ogg"
+
+
+def comprimir_para_opus(audio_bytes, nome_original, remover_silencios=False):
+    """
+    Converte o áudio para Opus 16 kHz mono, opcionalmente removendo silêncios com mais de 1 s.
+    Retorna (nome, bytes) do arquivo convertido ou o original, se a conversão não o
+    deixar menor. Lança RuntimeError se o ffmpeg falhar.
+    """
+    extensao = os.path.splitext(nome_original)[1]
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho_entrada = os.path.join(diretorio, "entrada" + (extensao or ".audio"))
+        caminho_saida = os.path.join(diretorio, "saida.ogg")
+        with open(caminho_entrada, "wb") as arquivo:
+            arquivo.write(audio_bytes)
+        filtros = ["-af", FILTRO_REMOVER_SILENCIOS] if remover_silencios else []
+        _executar([FFMPEG_BIN, "-hide_banner", "-loglevel", "error", "-y", "-i", caminho_entrada]
+                  + filtros + ARGUMENTOS_OPUS + [caminho_saida])
+        with open(caminho_saida, "rb") as arquivo:
+            comprimido = arquivo.read()
+    if len(comprimido) >= len(audio_bytes) and not remover_silencios:
+        return nome_original, audio_bytes
+    return _nome_opus(nome_original), comprimido
+
+
+def pontos_de_corte(duracao_total, silencios, duracao_segmento_s=DURACAO_SEGMENTO_S,
+                    janela_silencio_s=JANELA_SILENCIO_S):
+    """Cortes a cada ~duracao_segmento_s, deslocados para o silêncio mais próximo dentro da janela."""
+    cortes = []
+    inicio = 0.0
+    while duracao_total - inicio > duracao_segmento_s:
+        ideal = inicio + duracao_segmento_s
+        proximos = [s for s in silencios if abs(s - ideal) <= janela_silencio_s and s > inicio]
+        corte = min(proximos, key=lambda s: abs(s - ideal)) if proximos else ideal
+        cortes.append(corte)
+        inicio = corte
+    return cortes
+
+
+def dividir_audio(audio_bytes, nome_original, duracao_segmento_s=DURACAO_SEGMENTO_S, sobreposicao_s=SOBREPOSICAO_S):
+    """
+    Divide o áudio em segmentos Opus 16 kHz mono, cortando preferencialmente em silêncios.
+    Cada segmento avança 'sobreposicao_s' sobre o seguinte. Retorna [(nome, bytes), ...]
+    na ordem do áudio. Lança RuntimeError se o ffmpeg falhar.
+    """
+    base, extensao = os.path.splitext(os.path.basename(nome_original))
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho_entrada = os.path.join(diretorio, "entrada" + (extensao or ".audio"))
+        with open(caminho_entrada, "wb") as arquivo:
+            arquivo.write(audio_bytes)
+        duracao_total = duracao_audio(caminho_entrada)
+        cortes = pontos_de_corte(duracao_total, detectar_silencios(caminho_entrada), duracao_segmento_s)
+        limites = list(zip([0.0] + cortes, cortes + [duracao_total]))
+
+        segmentos = []
+        for numero, (inicio, fim) in enumerate(limites, 1):
+            nome_segmento = f"{base}_parte{numero:03d}.ogg"
+            caminho_segmento = os.path.join(diretorio, nome_segmento)
+            _executar([FFMPEG_BIN, "-hide_banner", "-loglevel", "error", "-y",
+                       "-ss", f"{inicio:.3f}", "-t", f"{min(fim + sobreposicao_s, duracao_total) - inicio:.3f}",
+                       "-i", caminho_entrada] + ARGUMENTOS_OPUS + [caminho_segmento])
+            with open(caminho_segmento, "rb") as arquivo:
+                segmentos.append((nome_segmento, arquivo.read()))
+        return segmentos
+
+
+def _normalizar_palavra(palavra):
+    return re.sub(r"[^\w]", "", palavra.casefold())
+
+
+def unir_transcricoes(textos, palavras_comparadas=PALAVRAS_COMPARADAS_NA_EMENDA):
+    """
+    Junta as transcrições de segmentos sobrepostos. Na emenda, procura o maior trecho
+    comum entre o fim de um texto e o início do seguinte (ignorando pontuação e
+    maiúsculas) e mantém só uma cópia dele.
+    """
+    palavras = []
+    for texto in textos:
+        novas = (texto or "").split()
+        if not palavras:
+            palavras = novas
+            continue
+        cauda = palavras[-palavras_comparadas:]
+        cabeca = novas[:palavras_comparadas]
+        encontro = SequenceMatcher(None, [_normalizar_palavra(p) for p in cauda],
+                                   [_normalizar_palavra(p) for p in cabeca], autojunk=False
+                                   ).find_longest_match(0, len(cauda), 0, len(cabeca))
+        if encontro.size >= 3:  # Coincidências menores podem ser acaso ("de que a")
+            palavras = palavras[:len(palavras) - len(cauda) + encontro.a] + novas[encontro.b:]
+        else:
+            palavras = palavras + novas
+    return " ".join(palavras)
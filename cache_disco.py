@@ -0,0 +1,121 @@
+# cache_disco.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from contextlib import closing
+
+EntradaCache = namedtuple("EntradaCache", ["valor", "criado_em"])
+
+
+class CacheDisco:
+    """
+    Cache persistente em SQLite, compartilhado entre sessões, threads e processos.
+    Os valores são serializados em JSON. Entradas expiram após 'ttl_s' segundos e,
+    quando o total ultrapassa 'max_bytes', as menos usadas recentemente são removidas (LRU).
+    """
+
+    def __init__(self, caminho, ttl_s=None, max_bytes=50 * 1024 * 1024):
+        self.caminho = caminho
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.acertos = 0
+        self.falhas = 0
+        self._lock_contadores = threading.Lock()
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        with closing(self._conectar()) as conexao:
+            conexao.execute("PRAGMA journal_mode=WAL")  # Leitores não bloqueiam o escritor
+            conexao.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " chave TEXT PRIMARY KEY,"
+                " valor TEXT NOT NULL,"
+                " tamanho INTEGER NOT NULL,"
+                " criado_em REAL NOT NULL,"
+                " ultimo_acesso REAL NOT NULL)"
+            )
+            conexao.execute("CREATE INDEX IF NOT EXISTS idx_cache_ultimo_acesso ON cache (ultimo_acesso)")
+
+    def _conectar(self):
+        # Uma conexão por operação: sqlite3 não permite compartilhar conexões entre threads
+        return sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+
+    def _contar(self, acerto):
+        with self._lock_contadores:
+            if acerto:
+                self.acertos += 1
+            else:
+                self.falhas += 1
+
+    def obter(self, chave):
+        """Retorna EntradaCache(valor, criado_em) ou None se a chave não existir ou tiver expirado."""
+        agora = time.time()
+        with closing(self._conectar()) as conexao:
+            linha = conexao.execute("SELECT valor, criado_em FROM cache WHERE chave = ?", (chave,)).fetchone()
+            if linha is None:
+                self._contar(False)
+                return None
+            valor, criado_em = linha
+            if self.ttl_s is not None and agora - criado_em > self.ttl_s:
+                conexao.execute("DELETE FROM cache WHERE chave = ?", (chave,))
+                self._contar(False)
+                return None
+            conexao.execute("UPDATE cache SET ultimo_acesso = ? WHERE chave = ?", (agora, chave))
+        self._contar(True)
+        return EntradaCache(json.loads(valor), criado_em)
+
+    def gravar(self, chave, valor):
+        serializado = json.dumps(valor, ensure_ascii=False)
+        tamanho = len(serializado.encode("utf-8"))
+        if tamanho > self.max_bytes:
+            return  # Não cabe no cache; não vale a pena expulsar todo o resto
+        agora = time.time()
+        with closing(self._conectar()) as conexao:
+            conexao.execute("BEGIN IMMEDIATE")
+            try:
+                conexao.execute(
+                    "INSERT OR REPLACE INTO cache (chave, valor, tamanho, criado_em, ultimo_acesso)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (chave, serializado, tamanho, agora, agora),
+                )
+                self._expulsar(conexao, agora)
+                conexao.execute("COMMIT")
+            except Exception:
+                conexao.execute("ROLLBACK")
+                raise
+
+    def _expulsar(self, conexao, agora):
+        if self.ttl_s is not None:
+            conexao.execute("DELETE FROM cache WHERE criado_em < ?", (agora - self.ttl_s,))
+        total = conexao.execute("SELECT COALESCE(SUM(tamanho), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excesso = total - self.max_bytes
+        a_remover = []
+        linhas = conexao.execute("SELECT chave, tamanho FROM cache ORDER BY ultimo_acesso ASC").fetchall()
+        for chave, tamanho in linhas:
+            a_remover.append((chave,))
+            excesso -= tamanho
+            if excesso <= 0:
+                break
+        conexao.executemany("DELETE FROM cache WHERE chave = ?", a_remover)
+
+    def remover(self, chave):
+        with closing(self._conectar()) as conexao:
+            conexao.execute("DELETE FROM cache WHERE chave = ?", (chave,))
+
+    def estatisticas(self):
+        """Contadores de acertos/falhas deste processo e ocupação atual do cache."""
+        with closing(self._conectar()) as conexao:
+            itens, total = conexao.execute("SELECT COUNT(*), COALESCE(SUM(tamanho), 0) FROM cache").fetchone()
+        consultas = self.acertos + self.falhas
+        return {
+            "itens": itens,
+            "bytes": total,
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "taxa_acerto": self.acertos / consultas if consultas else 0.0,
+        }
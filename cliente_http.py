@@ -0,0 +1,151 @@
+# cliente_http.py
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
+
+STATUS_RETENTAVEIS = (429, 500, 502, 503, 504)
+MAX_TENTATIVAS = 4
+ESPERA_INICIAL_S = 1.0
+ESPERA_MAXIMA_S = 60.0  # Retry-After acima disso: devolve a resposta em vez de segurar a thread
+POOL_MAXSIZE = 16
+TIMEOUT_PADRAO = (5, 60)  # (conexão, leitura) em segundos
+METODOS_IDEMPOTENTES = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+
+def segundos_retry_after(valor):
+    """Interpreta o cabeçalho Retry-After (segundos ou data HTTP). Retorna None se inválido."""
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(valor).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def falhou_antes_de_enviar(erro):
+    """
+    True se a conexão nem chegou a ser estabelecida (timeout de conexão, conexão recusada,
+    DNS): o servidor não recebeu nada. "Connection aborted" e afins podem ocorrer depois de
+    o corpo ter sido enviado.
+    """
+    if isinstance(erro, requests.exceptions.ConnectTimeout):
+        return True
+    motivo = getattr(erro.args[0], "reason", None) if erro.args else None
+    # NewConnectionError e NameResolutionError do urllib3 derivam de ConnectTimeoutError
+    return isinstance(motivo, ConnectTimeoutError)
+
+
+class ClienteHttp:
+    """
+    Cliente HTTP compartilhado pelo processo: uma requests.Session com pool de conexões
+    (keep-alive, sem novo handshake TLS a cada chamada), timeout em toda requisição e
+    novas tentativas com espera exponencial para 429/5xx e falhas de conexão.
+    Quando a resposta traz Retry-After, a espera segue o cabeçalho.
+    Depois da última tentativa, a resposta (ou exceção) é devolvida ao chamador como de costume.
+    'antes_de_tentar()' e 'ao_responder(resposta)', se informados, envolvem cada tentativa
+    (usados pelo agendador de limites da Groq).
+    Falhas de conexão só são repetidas em qualquer caso para métodos idempotentes; nos demais
+    (POST), só se a requisição não chegou a ser enviada, para não cobrar uma transcrição ou
+    resposta duas vezes. 'retentar_conexao' força um ou outro comportamento por chamada.
+    """
+
+    def __init__(self, max_tentativas=MAX_TENTATIVAS, espera_inicial_s=ESPERA_INICIAL_S,
+                 espera_maxima_s=ESPERA_MAXIMA_S, pool_maxsize=POOL_MAXSIZE):
+        self.max_tentativas = max_tentativas
+        self.espera_inicial_s = espera_inicial_s
+        self.espera_maxima_s = espera_maxima_s
+        self.sessao = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+        self.sessao.mount("https://", adaptador)
+        self.sessao.mount("http://", adaptador)
+
+    def _espera(self, tentativa, resposta=None):
+        retry_after = segundos_retry_after(resposta.headers.get("Retry-After")) if resposta is not None else None
+        if retry_after is not None:
+            return retry_after
+        # Exponencial com jitter, para que várias sessões não voltem todas no mesmo instante
+        return self.espera_inicial_s * (2 ** tentativa) * random.uniform(0.5, 1.0)
+
+    def requisitar(self, metodo, url, timeout=TIMEOUT_PADRAO, antes_de_tentar=None, ao_responder=None,
+                   retentar_conexao=None, **kwargs):
+        if retentar_conexao is None:
+            retentar_conexao = metodo.upper() in METODOS_IDEMPOTENTES
+        for tentativa in range(self.max_tentativas):
+            ultima = tentativa == self.max_tentativas - 1
+            if antes_de_tentar is not None:
+                antes_de_tentar()
+            try:
+                resposta = self.sessao.request(metodo, url, timeout=timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout) as erro:
+                # ReadTimeout não entra aqui: o servidor pode já ter processado (e cobrado) a requisição
+                if ultima or not (retentar_conexao or falhou_antes_de_enviar(erro)):
+                    raise
+                time.sleep(min(self._espera(tentativa), self.espera_maxima_s))
+                continue
+            if ao_responder is not None:
+                ao_responder(resposta)
+            if resposta.status_code not in STATUS_RETENTAVEIS or ultima:
+                return resposta
+            if resposta.status_code == 429 and antes_de_tentar is not None:
+                resposta.close()
+                continue  # antes_de_tentar segura a próxima tentativa até o limite liberar (sem teto de espera)
+            espera = self._espera(tentativa, resposta)
+            if espera > self.espera_maxima_s:
+                return resposta
+            resposta.close()  # Devolve a conexão ao pool antes de dormir
+            time.sleep(espera)
+        return resposta
+
+    def get(self, url, **kwargs):
+        return self.requisitar("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.requisitar("POST", url, **kwargs)
+
+
+_cliente_http = None
+_cliente_http_lock = threading.Lock()
+
+
+def obter_cliente_http():
+    """Instância única de ClienteHttp para o processo (todas as sessões do Streamlit)."""
+    global _cliente_http
+    with _cliente_http_lock:
+        if _cliente_http is None:
+            _cliente_http = ClienteHttp()
+        return _cliente_http
+
+
+def iterar_eventos_sse(resposta):
+    """
+    Gera (evento, dados) de uma resposta text/event-stream aberta com stream=True.
+    Linhas 'data:' consecutivas são unidas com "\n"; comentários (':') são ignorados.
+    """
+    resposta.encoding = "utf-8"  # SSE é sempre UTF-8, independentemente do Content-Type
+    evento, linhas_dados = None, []
+    # chunk_size=None: entrega o que chegar, sem esperar juntar um bloco de tamanho fixo
+    for linha in resposta.iter_lines(chunk_size=None, decode_unicode=True):
+        if not linha:
+            if linhas_dados:
+                yield evento or "message", "\n".join(linhas_dados)
+            evento, linhas_dados = None, []
+            continue
+        if linha.startswith(":"):
+            continue
+        campo, _, valor = linha.partition(":")
+        if valor.startswith(" "):
+            valor = valor[1:]
+        if campo == "event":
+            evento = valor
+        elif campo == "data":
+            linhas_dados.append(valor)
+    if linhas_dados:
+        yield evento or "message", "\n".join(linhas_dados)
@@ -0,0 +1,161 @@
+# coalescencia.py
+import collections
+import threading
+from concurrent.futures import Future
+
+
+class _ExecucaoInterrompida(Exception):
+    """Avisa quem aguardava que a execução compartilhada foi interrompida sem resultado."""
+
+
+class ExecucaoCompartilhada:
+    """
+    Execução em andamento em uma thread própria, com um registro de eventos ao vivo:
+    a função publica eventos e cada interessado os lê, desde o primeiro, na sua própria
+    thread e à medida que chegam (ver Coalescedor.transmitir).
+    """
+
+    def __init__(self):
+        self._condicao = threading.Condition()
+        self._eventos = []
+        self._concluida = False
+        self._resultado = None
+        self._erro = None
+
+    def publicar(self, tipo, valor=None):
+        with self._condicao:
+            self._eventos.append((tipo, valor))
+            self._condicao.notify_all()
+
+    def _concluir(self, resultado=None, erro=None):
+        with self._condicao:
+            self._resultado = resultado
+            self._erro = erro
+            self._concluida = True
+            self._condicao.notify_all()
+
+    def eventos(self):
+        """Gera os eventos (tipo, valor) publicados, desde o primeiro, até a execução terminar."""
+        lidos = 0
+        while True:
+            with self._condicao:
+                self._condicao.wait_for(lambda: lidos < len(self._eventos) or self._concluida)
+                novos = self._eventos[lidos:]
+                terminou = self._concluida
+            lidos += len(novos)
+            yield from novos
+            if terminou:
+                return
+
+    def resultado(self):
+        """Aguarda o fim da execução e retorna o resultado da função (ou lança a exceção dela)."""
+        with self._condicao:
+            self._condicao.wait_for(lambda: self._concluida)
+        if self._erro is not None:
+            raise self._erro
+        return self._resultado
+
+
+class Coalescedor:
+    """
+    Coalescência de chamadas ("single-flight"): enquanto uma chamada com o mesmo grupo e
+    chave está em andamento no processo, as chamadas idênticas que chegam aguardam e
+    recebem o mesmo resultado (ou a mesma exceção) em vez de repetir o trabalho.
+    Não guarda nada depois que a chamada termina; para isso existem os caches em disco.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._em_andamento = {}  # (grupo, chave) -> Future da execução compartilhada
+        self._transmissoes = {}  # (grupo, chave) -> ExecucaoCompartilhada em andamento
+        self._contadores = collections.defaultdict(lambda: {"executadas": 0, "compartilhadas": 0})
+
+    def executar(self, grupo, chave, funcao, *args, **kwargs):
+        """
+        Executa funcao(*args, **kwargs) ou aguarda a execução idêntica em andamento. Retorna (resultado, compartilhado).
+        Só o resultado e exceções comuns (Exception) são compartilhados: se a execução for interrompida
+        por uma BaseException (ex.: rerun ou parada da sessão que a iniciou, no Streamlit), quem
+        aguardava executa a chamada por conta própria.
+        """
+        while True:
+            with self._lock:
+                futuro = self._em_andamento.get((grupo, chave))
+                lider = futuro is None
+                if lider:
+                    futuro = self._em_andamento[(grupo, chave)] = Future()
+                    self._contadores[grupo]["executadas"] += 1
+                else:
+                    self._contadores[grupo]["compartilhadas"] += 1
+            if lider:
+                break
+            try:
+                return futuro.result(), True
+            except _ExecucaoInterrompida:
+                with self._lock:
+                    self._contadores[grupo]["compartilhadas"] -= 1
+        try:
+            resultado = funcao(*args, **kwargs)
+        except BaseException as erro:
+            # A chave é liberada antes de avisar quem aguarda, para que a nova tentativa não reencontre este Future
+            self._liberar(grupo, chave)
+            futuro.set_exception(erro if isinstance(erro, Exception) else _ExecucaoInterrompida())
+            raise
+        self._liberar(grupo, chave)
+        futuro.set_result(resultado)
+        return resultado, False
+
+    def _liberar(self, grupo, chave):
+        with self._lock:
+            del self._em_andamento[(grupo, chave)]
+
+    def transmitir(self, grupo, chave, funcao, *args, **kwargs):
+        """
+        Como executar, mas a função roda em uma thread própria e recebe 'publicar(tipo, valor)'
+        como primeiro argumento. Retorna (ExecucaoCompartilhada, compartilhada) sem esperar o
+        fim: quem chamou acompanha os eventos na própria thread (e roda os próprios callbacks),
+        então nenhuma sessão executa código de outra. Como a execução não roda na thread de
+        uma sessão, um rerun ou parada de quem a iniciou não a interrompe.
+        """
+        with self._lock:
+            execucao = self._transmissoes.get((grupo, chave))
+            if execucao is not None:
+                self._contadores[grupo]["compartilhadas"] += 1
+                return execucao, True
+            execucao = self._transmissoes[(grupo, chave)] = ExecucaoCompartilhada()
+            self._contadores[grupo]["executadas"] += 1
+
+        def executar_e_concluir():
+            resultado, erro = None, None
+            try:
+                resultado = funcao(execucao.publicar, *args, **kwargs)
+            except BaseException as e:
+                erro = e
+            # A chave é liberada antes de concluir: quem chegar depois do fim inicia uma nova execução
+            with self._lock:
+                del self._transmissoes[(grupo, chave)]
+            execucao._concluir(resultado, erro)
+
+        threading.Thread(target=executar_e_concluir, name=f"coalescencia-{grupo}", daemon=True).start()
+        return execucao, False
+
+    def estatisticas(self):
+        """Por grupo: execuções reais, chamadas que aproveitaram uma execução em andamento e a fração coalescida."""
+        with self._lock:
+            return {
+                grupo: {**contadores, "taxa_coalescencia": contadores["compartilhadas"] / (
+                    contadores["executadas"] + contadores["compartilhadas"])}
+                for grupo, contadores in self._contadores.items()
+            }
+
+
+_coalescedor = None
+_coalescedor_lock = threading.Lock()
+
+
+def obter_coalescedor():
+    """Instância única de Coalescedor para o processo (todas as sessões do Streamlit)."""
+    global _coalescedor
+    with _coalescedor_lock:
+        if _coalescedor is None:
+            _coalescedor = Coalescedor()
+        return _coalescedor
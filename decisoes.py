@@ -0,0 +1,125 @@
+# decisoes.py
+import re
+
+# Número único do CNJ: NNNNNNN-DD.AAAA.J.TR.OOOO
+PADRAO_NUMERO_PROCESSO = re.compile(r"\b\d{7}-\d{2}\.\d{4}\.\d\.\d{2}\.\d{4}\b")
+PADRAO_RELATOR = re.compile(r"Relator(?:\(a\)|a)?\s*:?[ \t]*([^\n]+)", re.IGNORECASE)
+PADRAO_ORGAO_ROTULADO = re.compile(r"[ÓO]rg[ãa]o\s+Julgador\s*:?[ \t]*([^\n]+)", re.IGNORECASE)
+PADRAO_ORGAO_NUMERADO = re.compile(r"\b(\d+[ªºa]\s+(?:C[âa]mara|Turma|Se[çc][ãa]o)[^\n,;.]*)", re.IGNORECASE)
+PADRAO_DATA_JULGAMENTO = re.compile(
+    r"(?:Julgad[oa]\s+em|Data\s+d[eo]\s+Julgamento|Julgamento)\s*:?\s*(\d{2})/(\d{2})/(\d{4})", re.IGNORECASE)
+PADRAO_EMENTA = re.compile(r"EMENTA\s*[:.\-–]?\s*(.+?)(?:\n\s*\n|\bAC[ÓO]RD[ÃA]O\b|$)", re.IGNORECASE | re.DOTALL)
+
+# Ordem das colunas na exportação colunar
+CAMPOS_DECISAO = ("id", "numero_processo", "orgao_julgador", "relator", "data_julgamento", "ementa", "link", "texto")
+# A ementa é um trecho do texto: é extraída quando lida, em vez de ser guardada como uma segunda cópia
+CAMPOS_ARMAZENADOS = tuple(campo for campo in CAMPOS_DECISAO if campo != "ementa")
+# De onde veio a decisão (trecho destacado do índice local, termos do lote que a encontraram): não é exportado
+CAMPOS_CONTEXTO = ("trecho", "termos")
+
+
+def _primeiro_grupo(padrao, texto):
+    encontrado = padrao.search(texto)
+    return " ".join(encontrado.group(1).split()) if encontrado else None
+
+
+class Decisao:
+    """
+    Uma decisão do TJGO com os campos extraídos do texto do bloco de resultado.
+    Usa __slots__ para que milhares de decisões em memória não carreguem um dict cada; é
+    a forma guardada em memória (inclusive na sessão), e para_dict/de_dict só são usados na
+    fronteira com o protocolo NDJSON, o JSON da linha de comando e o cache em disco.
+    Campos não encontrados ficam como None; 'data_julgamento' é ISO (AAAA-MM-DD).
+    A ementa não é armazenada nem vai para os resultados da busca: é extraída do texto
+    quando lida (na exportação).
+    """
+    __slots__ = CAMPOS_ARMAZENADOS + CAMPOS_CONTEXTO
+
+    def __init__(self, id, texto, numero_processo=None, orgao_julgador=None, relator=None,
+                 data_julgamento=None, link=None, trecho=None, termos=None):
+        self.id = id
+        self.texto = texto
+        self.numero_processo = numero_processo
+        self.orgao_julgador = orgao_julgador
+        self.relator = relator
+        self.data_julgamento = data_julgamento
+        self.link = link
+        self.trecho = trecho
+        self.termos = termos
+
+    @property
+    def ementa(self):
+        return _primeiro_grupo(PADRAO_EMENTA, self.texto)
+
+    @classmethod
+    def do_texto(cls, id, texto, link=None):
+        """Extrai os campos estruturados do texto livre de um bloco '.search-result'."""
+        data = PADRAO_DATA_JULGAMENTO.search(texto)
+        numero = PADRAO_NUMERO_PROCESSO.search(texto)
+        return cls(
+            id,
+            texto,
+            numero_processo=numero.group(0) if numero else None,
+            orgao_julgador=_primeiro_grupo(PADRAO_ORGAO_ROTULADO, texto) or _primeiro_grupo(PADRAO_ORGAO_NUMERADO, texto),
+            relator=_primeiro_grupo(PADRAO_RELATOR, texto),
+            data_julgamento=f"{data.group(3)}-{data.group(2)}-{data.group(1)}" if data else None,
+            link=link,
+        )
+
+    @classmethod
+    def de_dict(cls, res):
+        # Resultados gravados antes trazem "ementa": ela é ignorada, pois sai do texto
+        return cls(**{campo: res.get(campo) for campo in CAMPOS_ARMAZENADOS + CAMPOS_CONTEXTO})
+
+    def para_dict(self):
+        """Formato dos resultados da busca ({"id", "texto", ...}); campos vazios são omitidos."""
+        return {campo: getattr(self, campo) for campo in CAMPOS_ARMAZENADOS + CAMPOS_CONTEXTO
+                if getattr(self, campo) is not None}
+
+    def substituir(self, **campos):
+        """Cópia com os campos informados trocados (o texto não é copiado, só referenciado)."""
+        return Decisao(**{**{campo: getattr(self, campo) for campo in CAMPOS_ARMAZENADOS + CAMPOS_CONTEXTO}, **campos})
+
+    def __repr__(self):
+        return f"Decisao(id={self.id!r}, numero_processo={self.numero_processo!r})"
+
+
+def separar_resultados(resultados):
+    """Divide os resultados de uma busca em (decisões, avisos e erros), mantendo a ordem de cada lista."""
+    decisoes, avisos = [], []
+    for res in resultados:
+        (decisoes if isinstance(res, Decisao) else avisos).append(res)
+    return decisoes, avisos
+
+
+def decisoes_dos_resultados(resultados):
+    """Só as decisões dos resultados de uma busca, ignorando avisos e erros."""
+    return separar_resultados(resultados)[0]
+
+
+def resultados_de_dicts(itens):
+    """Resultados lidos do protocolo ou do cache (dicts): os que têm texto viram Decisao."""
+    return [Decisao.de_dict(item) if item.get("texto") else item for item in itens]
+
+
+def resultados_para_dicts(resultados):
+    """Resultados no formato do protocolo e do cache: Decisao vira dict; avisos e erros já são dicts."""
+    return [res.para_dict() if isinstance(res, Decisao) else res for res in resultados]
+
+
+def tabela_colunar(decisoes):
+    """Uma lista por campo, na ordem de CAMPOS_DECISAO: filtrar e ordenar por coluna fica barato."""
+    return {campo: [getattr(decisao, campo) for decisao in decisoes] for campo in CAMPOS_DECISAO}
+
+
+def exportar_parquet(decisoes, destino):
+    """
+    Grava as decisões em Parquet ('destino' é um caminho ou um arquivo binário aberto).
+    Requer pyarrow (instalado junto com o Streamlit).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tabela = pa.table(tabela_colunar(decisoes), schema=pa.schema(
+        [("id", pa.int32())] + [(campo, pa.string()) for campo in CAMPOS_DECISAO[1:]]))
+    pq.write_table(tabela, destino, compression="zstd")
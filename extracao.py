@@ -0,0 +1,180 @@
+# extracao.py
+# Fica fora de interface.py porque as funções executadas no pool de processos
+# precisam ser importáveis pelos processos filhos.
+import codecs
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from xml.etree import ElementTree
+from pypdf import PdfReader
+
+PAGINAS_POR_TAREFA = 20  # Páginas extraídas por tarefa enviada ao pool de processos
+TAMANHO_BLOCO_TXT = 1024 * 1024
+
+NS_WORD = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+TAG_PARAGRAFO = NS_WORD + "p"
+TAG_TEXTO = NS_WORD + "t"
+TAG_TABULACAO = NS_WORD + "tab"
+TAGS_QUEBRA = (NS_WORD + "br", NS_WORD + "cr")
+
+
+class PoolExtracao:
+    """
+    Pool de processos que se recria quando um processo filho morre: um ProcessPoolExecutor
+    quebrado recusa todas as tarefas seguintes, e o pool é compartilhado pelo servidor inteiro.
+    """
+
+    def __init__(self, max_processos=None):
+        self.max_processos = max_processos or os.cpu_count()
+        self._lock = threading.Lock()
+        self._executor = self._criar_executor()
+
+    def _criar_executor(self):
+        # 'spawn' em vez de 'fork': o servidor do Streamlit tem várias threads, e fork copiaria locks travados
+        return ProcessPoolExecutor(max_workers=self.max_processos, mp_context=multiprocessing.get_context("spawn"))
+
+    def submit(self, funcao, *args):
+        with self._lock:
+            executor = self._executor
+        try:
+            return executor.submit(funcao, *args)
+        except BrokenProcessPool:
+            # Quebrado por uma extração anterior: troca o executor (uma vez só, se outra thread não trocou antes)
+            with self._lock:
+                if self._executor is executor:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self._executor = self._criar_executor()
+                executor = self._executor
+            return executor.submit(funcao, *args)
+
+
+def criar_pool_extracao(max_processos=None):
+    return PoolExtracao(max_processos)
+
+
+def intervalos_de_paginas(total_paginas, paginas_por_tarefa=PAGINAS_POR_TAREFA):
+    return [(inicio, min(inicio + paginas_por_tarefa, total_paginas))
+            for inicio in range(0, total_paginas, paginas_por_tarefa)]
+
+
+def extrair_paginas_pdf(caminho, inicio, fim):
+    """Texto das páginas [inicio, fim) do PDF em 'caminho'. Executada nos processos do pool."""
+    reader = PdfReader(caminho)
+    return [reader.pages[numero].extract_text() or "" for numero in range(inicio, fim)]
+
+
+def iterar_texto_txt(arquivo, tamanho_bloco=TAMANHO_BLOCO_TXT):
+    """Decodifica o TXT (UTF-8) em blocos; um caractere partido entre dois blocos não se perde."""
+    decodificador = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    while True:
+        bloco = arquivo.read(tamanho_bloco)
+        if not bloco:
+            break
+        texto = decodificador.decode(bloco)
+        if texto:
+            yield texto
+    final = decodificador.decode(b"", final=True)
+    if final:
+        yield final
+
+
+def iterar_texto_docx(arquivo):
+    """
+    Lê 'word/document.xml' com iterparse e gera um parágrafo por vez (com "\\n"),
+    incluindo os de tabelas. Os elementos já lidos são descartados, então a memória
+    não cresce com o tamanho do documento.
+    """
+    with zipfile.ZipFile(arquivo) as pacote, pacote.open("word/document.xml") as documento:
+        profundidade = 0
+        corpo = None
+        partes = []
+        for evento, elemento in ElementTree.iterparse(documento, events=("start", "end")):
+            if evento == "start":
+                profundidade += 1
+                if profundidade == 2:
+                    corpo = elemento  # <w:body>
+                continue
+            if elemento.tag == TAG_TEXTO:
+                partes.append(elemento.text or "")
+            elif elemento.tag == TAG_TABULACAO:
+                partes.append("\t")
+            elif elemento.tag in TAGS_QUEBRA:
+                partes.append("\n")
+            elif elemento.tag == TAG_PARAGRAFO:
+                yield "".join(partes) + "\n"
+                partes = []
+            if profundidade == 3 and corpo is not None:
+                corpo.clear()  # Fim de um bloco de primeiro nível (parágrafo ou tabela)
+            profundidade -= 1
+
+
+def _iterar_paginas_sequencial(reader, ao_progredir, primeira_pagina=0):
+    total_paginas = len(reader.pages)
+    for numero in range(primeira_pagina, total_paginas):
+        yield reader.pages[numero].extract_text() or ""
+        ao_progredir(numero + 1, total_paginas)
+
+
+def iterar_paginas_pdf(arquivo, pool=None, ao_progredir=None):
+    """
+    Gera o texto de cada página do PDF (arquivo aberto em modo binário), em ordem.
+    Com 'pool', faixas de PAGINAS_POR_TAREFA páginas são extraídas em paralelo nos
+    processos e entregues assim que as anteriores estiverem prontas.
+    'ao_progredir(paginas_prontas, total_paginas)' é chamado a cada página ou faixa.
+    """
+    ao_progredir = ao_progredir or (lambda prontas, total: None)
+    reader = PdfReader(arquivo)
+    total_paginas = len(reader.pages)
+    if pool is None or total_paginas <= PAGINAS_POR_TAREFA:
+        yield from _iterar_paginas_sequencial(reader, ao_progredir)
+        return
+
+    # Os processos leem o PDF do disco: enviar os bytes a cada tarefa custaria uma cópia por faixa
+    arquivo.seek(0)
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temporario:
+        shutil.copyfileobj(arquivo, temporario)
+    try:
+        futuros = {}
+        prontas = 0
+        proxima = 0  # Primeira página ainda não entregue
+        faixas_prontas = {}  # Faixas que terminaram antes das anteriores
+        try:
+            for inicio, fim in intervalos_de_paginas(total_paginas):
+                futuros[pool.submit(extrair_paginas_pdf, temporario.name, inicio, fim)] = inicio
+            for futuro in as_completed(futuros):
+                textos = futuro.result()
+                faixas_prontas[futuros[futuro]] = textos
+                prontas += len(textos)
+                ao_progredir(prontas, total_paginas)
+                while proxima in faixas_prontas:
+                    textos = faixas_prontas.pop(proxima)
+                    yield from textos
+                    proxima += len(textos)
+        except BrokenProcessPool:
+            # Um processo morreu (falta de memória, ambiente sem processos filhos): segue na thread.
+            # O PoolExtracao troca o executor quebrado na próxima extração.
+            yield from _iterar_paginas_sequencial(reader, ao_progredir, primeira_pagina=proxima)
+        finally:
+            for futuro in futuros:
+                futuro.cancel()  # Falha em uma faixa ou gerador abandonado: não adianta extrair o resto
+    finally:
+        os.remove(temporario.name)
+
+
+def iterar_texto_arquivo(arquivo, extensao, pool=None, ao_progredir=None):
+    """
+    Gera o texto do arquivo em pedaços (blocos do TXT, parágrafos do DOCX, páginas do PDF),
+    sem materializar o documento inteiro. Lança ValueError para extensões não suportadas.
+    """
+    if extensao == ".txt":
+        return iterar_texto_txt(arquivo)
+    if extensao == ".docx":
+        return iterar_texto_docx(arquivo)
+    if extensao == ".pdf":
+        return (pagina + "\n" for pagina in iterar_paginas_pdf(arquivo, pool=pool, ao_progredir=ao_progredir))
+    raise ValueError(f"Formato não suportado: {extensao}")
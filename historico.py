@@ -0,0 +1,113 @@
+# historico.py
+import math
+import re
+
+CARACTERES_POR_TOKEN = 3.5  # Média aproximada para texto em português nos tokenizadores do Llama/Mixtral
+TOKENS_POR_MENSAGEM = 4  # Marcadores de papel e separadores que o modelo acrescenta a cada mensagem
+JANELA_CONTEXTO_PADRAO = 8192
+JANELAS_CONTEXTO = {
+    "llama-3.1-8b-instant": 131072,
+    "llama-3.3-70b-versatile": 131072,
+    "gemma2-9b-it": 8192,
+    "gemma-7b-it": 8192,
+}
+FRACAO_JANELA_HISTORICO = 0.75  # O restante da janela fica para a resposta
+TOKENS_RESERVADOS_RESUMO = 600
+FRACAO_APOS_RESUMO = 0.5  # Ao resumir, deixa folga para os próximos turnos reaproveitarem o mesmo resumo
+
+PROMPT_RESUMO = (
+    "Resuma de forma concisa, em português, a conversa abaixo entre o usuário e o assistente jurídico. "
+    "Preserve fatos, pedidos, teses, conclusões, números e pendências; omita cortesias.\n\n"
+    "{resumo_anterior}Conversa:\n{conversa}"
+)
+
+
+def estimar_tokens(texto):
+    return math.ceil(len(texto or "") / CARACTERES_POR_TOKEN) + TOKENS_POR_MENSAGEM
+
+
+def tokens_das_mensagens(mensagens):
+    return sum(estimar_tokens(msg["content"]) for msg in mensagens)
+
+
+def janela_contexto(model_id):
+    """Janela de contexto do modelo: tabela conhecida, sufixo numérico do nome (ex.: '-8192') ou o padrão."""
+    if model_id in JANELAS_CONTEXTO:
+        return JANELAS_CONTEXTO[model_id]
+    sufixo = re.search(r"-(\d{4,6})$", model_id or "")
+    return int(sufixo.group(1)) if sufixo else JANELA_CONTEXTO_PADRAO
+
+
+def orcamento_historico(model_id):
+    return int(janela_contexto(model_id) * FRACAO_JANELA_HISTORICO)
+
+
+def prompt_resumo(resumo_anterior, mensagens):
+    conversa = "\n\n".join(f"{msg['role'].upper()}: {msg['content']}" for msg in mensagens)
+    anterior = f"Resumo do trecho anterior da conversa:\n{resumo_anterior}\n\n" if resumo_anterior else ""
+    return PROMPT_RESUMO.format(resumo_anterior=anterior, conversa=conversa)
+
+
+def _tamanho_ancora(mensagens):
+    # Mensagens de sistema iniciais mais a primeira mensagem do usuário (os fatos)
+    tamanho = 0
+    while tamanho < len(mensagens) and mensagens[tamanho]["role"] == "system":
+        tamanho += 1
+    if tamanho < len(mensagens) and mensagens[tamanho]["role"] == "user":
+        tamanho += 1
+    return tamanho
+
+
+def _inicio_recentes(resto, disponivel):
+    """Índice em 'resto' a partir do qual as mensagens cabem em 'disponivel' (a última sempre entra)."""
+    usados = 0
+    inicio = len(resto)
+    while inicio > 0:
+        tokens = estimar_tokens(resto[inicio - 1]["content"])
+        if inicio < len(resto) and usados + tokens > disponivel:
+            break
+        usados += tokens
+        inicio -= 1
+    return inicio
+
+
+def montar_janela(mensagens, orcamento, resumo=None, resumir=None):
+    """
+    Monta as mensagens a enviar dentro de 'orcamento' tokens (estimados): a âncora (sistema
+    e fatos) vai sempre inteira, seguida de um resumo das mensagens antigas e das mais
+    recentes que couberem. 'resumo' é o resumo em cache ({"ate": n, "texto": ...}, cobrindo
+    as n primeiras mensagens após a âncora); 'resumir(resumo_anterior, mensagens)' gera um
+    novo resumo (ou None em caso de falha, e então as mensagens antigas são descartadas).
+    Retorna (mensagens_a_enviar, resumo_atualizado, relatorio).
+    """
+    tamanho_ancora = _tamanho_ancora(mensagens)
+    ancora, resto = mensagens[:tamanho_ancora], mensagens[tamanho_ancora:]
+    tokens_historico = tokens_das_mensagens(mensagens)
+    relatorio = {"tokens_historico": tokens_historico, "tokens_enviados": tokens_historico,
+                 "tokens_economizados": 0, "mensagens_resumidas": 0, "mensagens_descartadas": 0}
+    if tokens_historico <= orcamento:
+        return mensagens, resumo, relatorio
+
+    disponivel = max(0, orcamento - tokens_das_mensagens(ancora) - TOKENS_RESERVADOS_RESUMO)
+    necessario = _inicio_recentes(resto, disponivel)  # Mensagens que precisam sair do histórico
+    if resumo is not None and necessario <= resumo["ate"] <= len(resto) - 1:
+        inicio = resumo["ate"]  # O resumo em cache já cobre o suficiente
+    else:
+        inicio = max(necessario, _inicio_recentes(resto, int(disponivel * FRACAO_APOS_RESUMO)))
+        aproveitavel = resumo is not None and resumo["ate"] <= inicio
+        novo_texto = None
+        if resumir is not None:
+            novo_texto = resumir(resumo["texto"] if aproveitavel else None,
+                                 resto[resumo["ate"]:inicio] if aproveitavel else resto[:inicio])
+        resumo = {"ate": inicio, "texto": novo_texto} if novo_texto else None
+
+    janela = list(ancora)
+    if resumo is not None:
+        janela.append({"role": "system", "content": f"Resumo da conversa anterior:\n{resumo['texto']}"})
+        relatorio["mensagens_resumidas"] = inicio
+    else:
+        relatorio["mensagens_descartadas"] = inicio
+    janela.extend(resto[inicio:])
+    relatorio["tokens_enviados"] = tokens_das_mensagens(janela)
+    relatorio["tokens_economizados"] = max(0, tokens_historico - relatorio["tokens_enviados"])
+    return janela, resumo, relatorio
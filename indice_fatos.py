@@ -0,0 +1,88 @@
+# indice_fatos.py
+import collections
+import math
+import re
+import unicodedata
+from analise_fatos import PADRAO_BLOCO_ANEXO, segmentos_dos_fatos
+
+CARACTERES_POR_PASSAGEM = 1200
+BM25_K1 = 1.5
+BM25_B = 0.75
+PALAVRAS_IGNORADAS = frozenset(
+    "a o as os e de da do das dos em na no nas nos um uma uns umas para por com sem que se ao aos "
+    "ou como mais mas foi ser sao sua seu suas seus ele ela eles elas isso este esta esse essa qual "
+    "quais quando onde sobre entre pelo pela pelos pelas ja nao ha the of".split())
+
+
+def termos(texto):
+    """Palavras sem acentos e em minúsculas, como o 'unicode61 remove_diacritics' do índice de jurisprudência."""
+    sem_acentos = "".join(c for c in unicodedata.normalize("NFD", texto.casefold()) if not unicodedata.combining(c))
+    return [palavra for palavra in re.findall(r"\w+", sem_acentos) if palavra not in PALAVRAS_IGNORADAS]
+
+
+def dividir_em_passagens(texto, max_caracteres=CARACTERES_POR_PASSAGEM):
+    """
+    Divide os fatos em passagens de até ~max_caracteres, por parágrafos, sem misturar
+    anexos diferentes. Retorna [{"origem": nome do anexo ou None, "texto": ...}] na ordem.
+    """
+    passagens = []
+    for segmento in segmentos_dos_fatos(texto):
+        anexo = PADRAO_BLOCO_ANEXO.fullmatch(segmento)
+        origem = anexo.group("nome") if anexo else None
+        if anexo:
+            segmento = segmento.strip().split("\n", 1)[1].rsplit("\n", 1)[0]  # Sem as linhas de marcação
+        atual = ""
+        for paragrafo in re.split(r"\n\s*\n", segmento):
+            if atual and len(atual) + len(paragrafo) > max_caracteres:
+                passagens.append({"origem": origem, "texto": atual.strip()})
+                atual = ""
+            atual += paragrafo + "\n\n"
+            while len(atual) > max_caracteres * 2:  # Parágrafo enorme (ex.: transcrição sem quebras)
+                passagens.append({"origem": origem, "texto": atual[:max_caracteres].strip()})
+                atual = atual[max_caracteres:]
+        if atual.strip():
+            passagens.append({"origem": origem, "texto": atual.strip()})
+    return passagens
+
+
+class IndiceFatos:
+    """
+    Índice invertido em memória (BM25) sobre as passagens dos fatos de uma sessão.
+    Construído uma vez por texto de fatos; as consultas só percorrem as listas dos termos
+    da pergunta.
+    """
+
+    def __init__(self, texto):
+        self.passagens = dividir_em_passagens(texto)
+        self.postings = collections.defaultdict(list)  # termo -> [(passagem, frequência)]
+        self.tamanhos = []
+        for indice, passagem in enumerate(self.passagens):
+            palavras = termos(passagem["texto"])
+            self.tamanhos.append(len(palavras))
+            for termo, frequencia in collections.Counter(palavras).items():
+                self.postings[termo].append((indice, frequencia))
+        self.tamanho_medio = (sum(self.tamanhos) / len(self.tamanhos)) if self.tamanhos else 0.0
+
+    def buscar(self, consulta, k=6):
+        """Até k passagens com score BM25 > 0, na ordem do texto original: [(passagem, score)]."""
+        total = len(self.passagens)
+        scores = collections.defaultdict(float)
+        for termo in set(termos(consulta)):
+            lista = self.postings.get(termo)
+            if not lista:
+                continue
+            idf = math.log(1 + (total - len(lista) + 0.5) / (len(lista) + 0.5))
+            for indice, frequencia in lista:
+                normalizacao = BM25_K1 * (1 - BM25_B + BM25_B * self.tamanhos[indice] / self.tamanho_medio)
+                scores[indice] += idf * frequencia * (BM25_K1 + 1) / (frequencia + normalizacao)
+        melhores = sorted(scores, key=scores.get, reverse=True)[:k]
+        return [(self.passagens[indice], scores[indice]) for indice in sorted(melhores)]
+
+
+def mensagem_com_passagens(passagens):
+    """Mensagem que substitui os fatos completos no histórico enviado ao modelo."""
+    trechos = "\n\n".join(
+        (f"[Trecho de '{passagem['origem']}']\n" if passagem["origem"] else "[Trecho do relato]\n") + passagem["texto"]
+        for passagem in passagens)
+    return ("Fatos do caso (apenas os trechos mais relevantes para a pergunta atual; "
+            "a análise inicial considerou os fatos completos):\n\n" + trechos)
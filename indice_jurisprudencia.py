@@ -0,0 +1,112 @@
+# indice_jurisprudencia.py
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from contextlib import closing
+from decisoes import Decisao
+
+
+def _hash_conteudo(texto):
+    # Normaliza espaços para que a mesma decisão com quebras de linha diferentes não duplique
+    return hashlib.sha256(" ".join(texto.split()).encode("utf-8")).hexdigest()
+
+
+def _consulta_fts(termo):
+    """Converte o termo digitado em uma consulta FTS5 (todas as palavras, sem operadores)."""
+    palavras = re.findall(r"\w+", termo)
+    return " ".join(f'"{palavra}"' for palavra in palavras)
+
+
+class IndiceJurisprudencia:
+    """
+    Índice local (SQLite FTS5) com todas as decisões já obtidas do TJGO.
+    Decisões repetidas são descartadas pelo hash do conteúdo. A busca usa ranking
+    BM25 e devolve um trecho com os termos encontrados destacados.
+    Lança sqlite3.OperationalError se o SQLite não tiver suporte a FTS5.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        with closing(self._conectar()) as conexao:
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.executescript("""
+                CREATE TABLE IF NOT EXISTS decisoes (
+                    id INTEGER PRIMARY KEY,
+                    hash TEXT NOT NULL UNIQUE,
+                    texto TEXT NOT NULL,
+                    link TEXT,
+                    termo_origem TEXT,
+                    ingerido_em REAL NOT NULL
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS decisoes_fts USING fts5(
+                    texto, content='decisoes', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                );
+                CREATE TRIGGER IF NOT EXISTS decisoes_ai AFTER INSERT ON decisoes BEGIN
+                    INSERT INTO decisoes_fts (rowid, texto) VALUES (new.id, new.texto);
+                END;
+            """)
+            # Índices criados antes da coluna 'link' (o link do inteiro teor se perdia nas buscas locais)
+            colunas = {linha[1] for linha in conexao.execute("PRAGMA table_info(decisoes)")}
+            if "link" not in colunas:
+                conexao.execute("ALTER TABLE decisoes ADD COLUMN link TEXT")
+
+    def _conectar(self):
+        return sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+
+    def ingerir(self, resultados, termo_origem=None):
+        """Adiciona ao índice as decisões (Decisao) dos resultados. Retorna quantas eram novas."""
+        agora = time.time()
+        novas = 0
+        with closing(self._conectar()) as conexao:
+            conexao.execute("BEGIN IMMEDIATE")
+            try:
+                for res in resultados:
+                    if not isinstance(res, Decisao) or not res.texto.strip():
+                        continue  # Avisos e erros da busca
+                    texto = res.texto
+                    hash_texto = _hash_conteudo(texto)
+                    cursor = conexao.execute(
+                        "INSERT OR IGNORE INTO decisoes (hash, texto, link, termo_origem, ingerido_em)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        (hash_texto, texto, res.link, termo_origem, agora),
+                    )
+                    novas += cursor.rowcount
+                    if not cursor.rowcount and res.link:
+                        # Decisão já indexada sem link (ex.: antes da migração): completa com o desta busca
+                        conexao.execute("UPDATE decisoes SET link = ? WHERE hash = ? AND link IS NULL",
+                                        (res.link, hash_texto))
+                conexao.execute("COMMIT")
+            except Exception:
+                conexao.execute("ROLLBACK")
+                raise
+        return novas
+
+    def buscar(self, termo, limite=10):
+        """
+        Retorna até 'limite' decisões (Decisao), da mais para a menos relevante pelo BM25,
+        com o 'trecho' em que os termos aparecem **destacados**.
+        """
+        consulta = _consulta_fts(termo)
+        if not consulta:
+            return []
+        with closing(self._conectar()) as conexao:
+            linhas = conexao.execute(
+                "SELECT d.texto, d.link, snippet(decisoes_fts, 0, '**', '**', ' … ', 24)"
+                " FROM decisoes_fts JOIN decisoes d ON d.id = decisoes_fts.rowid"
+                " WHERE decisoes_fts MATCH ? ORDER BY bm25(decisoes_fts) LIMIT ?",
+                (consulta, limite),
+            ).fetchall()
+        return [
+            Decisao.do_texto(indice + 1, texto, link).substituir(trecho=trecho)
+            for indice, (texto, link, trecho) in enumerate(linhas)
+        ]
+
+    def total(self):
+        with closing(self._conectar()) as conexao:
+            return conexao.execute("SELECT COUNT(*) FROM decisoes").fetchone()[0]
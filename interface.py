@@ -10,7 +10,29 @@ import sys
 import subprocess
 import json
 import os  # Importado para lidar com nomes de arquivo na transcrição
-from pypdf import PdfReader  # <<< NOVO: Para ler PDFs
+import mimetypes
+import hashlib
+import uuid
+import threading
+import time
+import queue
+import atexit
+import sqlite3
+import collections
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from extracao import criar_pool_extracao, iterar_texto_arquivo
+from cache_disco import CacheDisco
+from cliente_http import obter_cliente_http, iterar_eventos_sse
+from coalescencia import obter_coalescedor
+from limites_groq import obter_agendador_groq, PRIORIDADE_CHAT, PRIORIDADE_LOTE, PRIORIDADE_TRANSCRICAO
+from indice_jurisprudencia import IndiceJurisprudencia
+from jurisprudencia import mesclar_resultados_lote
+from decisoes import Decisao, exportar_parquet, resultados_de_dicts, resultados_para_dicts, separar_resultados
+from historico import estimar_tokens, montar_janela, orcamento_historico, prompt_resumo, tokens_das_mensagens
+from analise_fatos import dividir_fatos, prompt_mapa, prompt_reducao
+from indice_fatos import IndiceFatos, mensagem_com_passagens
+import audio
 import toml  # Para verificar se o arquivo secrets.toml existe e tem as chaves (opcional, mas bom para feedback)
 
 # --- Configurações Globais e Constantes ---
@@ -21,10 +43,48 @@ COMMON_GROQ_MODELS = ["llama3-8b-8192", "llama3-70b-8192", "mixtral-8x7b-32768",
 # Constantes para Transcrição com Groq
 GROQ_API_TRANSCRIPTIONS_ENDPOINT = "https://api.groq.com/openai/v1/audio/transcriptions"
 SELECTED_TRANSCRIPTION_MODEL = "whisper-large-v3-turbo"  # Mais rápido para transcrição PT
+TRANSCRICAO_IDIOMA = "pt"
 MAX_AUDIO_FILE_SIZE_MB = 25  # Limite da API Groq
 
+# Timeouts (conexão, leitura) em segundos por tipo de chamada; sem eles uma conexão presa trava a sessão
+TIMEOUT_TRANSCRICAO = (10, 300)  # Upload de até 25 MB
+TIMEOUT_CHAT = (10, 120)
+TIMEOUT_MODELOS = (5, 15)
+GROQ_TEMPERATURA = 0.7
+GROQ_TOKENS_RESPOSTA_ESTIMADOS = 1024  # Somados ao prompt para reservar a cota de tokens/min de cada chamada
+RESPOSTAS_CACHE_PADRAO = False  # Reaproveitar respostas idênticas é opcional (ativado na barra lateral)
+RESPOSTAS_CACHE_TTL_S = 7 * 24 * 3600
+RESPOSTAS_CACHE_MAX_MB = 50
+FATOS_PARTES_CONCORRENCIA = 4  # Partes de fatos extensos analisadas ao mesmo tempo no Groq
+TOKENS_INSTRUCOES_PARTE = 300  # Reserva para as instruções que acompanham cada parte
+FATOS_TOKENS_RECUPERACAO = 1500  # Acima disso, perguntas seguintes recebem só os trechos relevantes dos fatos
+RECUPERACAO_TOP_K = 6  # Trechos dos fatos enviados por pergunta
+TRANSCRICAO_CACHE_MAX_MB = 100  # Transcrições são texto: cabem dezenas de milhares de áudios
+TRANSCRICAO_CONCORRENCIA = 4  # Áudios enviados à Groq ao mesmo tempo
+AUDIO_COMPRIMIR_PADRAO = True  # Converte para Opus 16 kHz mono antes do envio (requer ffmpeg)
+AUDIO_REMOVER_SILENCIOS_PADRAO = False
+
+# Diretório dos caches persistentes em disco (compartilhados entre sessões)
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+# Constantes para o worker de busca de jurisprudência
+JURISPRUDENCIA_SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jurisprudencia.py')
+JURISPRUDENCIA_TIMEOUT_S = 120
+JURISPRUDENCIA_POOL_SIZE = 2  # Máximo de Chromes simultâneos para todas as sessões
+JURISPRUDENCIA_MAX_BUSCAS_POR_NAVEGADOR = 50  # Recicla o Chrome após N buscas para limitar vazamentos de memória
+JURISPRUDENCIA_MODO_RAPIDO = True  # Bloqueia imagens/CSS e extrai todos os resultados em uma única chamada
+JURISPRUDENCIA_BACKEND = "auto"  # "http" (sem navegador), "selenium" ou "auto" (HTTP com fallback para Selenium)
+JURISPRUDENCIA_MAX_RESULTADOS = 3  # Valor inicial do campo "Quantidade de decisões"
+JURISPRUDENCIA_MAX_RESULTADOS_LIMITE = 200
+JURISPRUDENCIA_CACHE_TTL_S = 7 * 24 * 3600  # Resultados de busca são reaproveitados por uma semana
+JURISPRUDENCIA_CACHE_MAX_MB = 50
+JURISPRUDENCIA_LOTE_CONCORRENCIA = 3  # Termos do lote buscados ao mesmo tempo (o pool ainda limita os Chromes)
+
 # <<< NOVO: Constantes para upload de arquivos de texto >>>
 ALLOWED_TEXT_EXTENSIONS = ["txt", "pdf", "docx"]
+EXTRACAO_ARQUIVOS_SIMULTANEOS = 4  # Arquivos de texto processados ao mesmo tempo
+EXTRACAO_MAX_PROCESSOS = None  # Processos para extrair páginas de PDF (None = um por CPU)
+EXTRACAO_CACHE_MAX_MB = 200  # Espaço em disco para textos já extraídos (os menos usados saem primeiro)
 
 
 # --- Funções Utilitárias ---
@@ -121,78 +181,123 @@ def create_docx_from_text_or_html(content_input, is_html=False, title="Resposta
 
 
 # <<< FUNÇÃO NOVA para extrair texto de arquivos >>>
-def extract_text_from_file(uploaded_file):
-    """Extrai texto de um arquivo carregado (txt, pdf, docx)."""
+def chave_cache_extracao(uploaded_file, file_extension):
+    # Hash calculado em blocos para não duplicar o arquivo na memória
+    hash_arquivo = hashlib.sha256()
+    uploaded_file.seek(0)
+    for bloco in iter(lambda: uploaded_file.read(1024 * 1024), b""):
+        hash_arquivo.update(bloco)
+    uploaded_file.seek(0)
+    # A extensão decide o extrator: os mesmos bytes como .txt e como .pdf dão textos diferentes
+    return json.dumps([hash_arquivo.hexdigest(), file_extension])
+
+
+def extract_text_from_file(uploaded_file, pool=None, ao_progredir=None, cache=None):
+    """
+    Extrai texto de um arquivo carregado (txt, pdf, docx).
+    Com 'pool' (PoolExtracao), as páginas de PDFs grandes são extraídas em paralelo;
+    'ao_progredir(paginas_prontas, total_paginas)' acompanha o andamento.
+    Com 'cache' (CacheDisco), um arquivo com o mesmo conteúdo não é processado de novo.
+    O texto é lido em pedaços pelos extratores de extracao.py (sem carregar o modelo de
+    objetos do DOCX nem decodificar o TXT de uma vez) e unido uma única vez no final.
+    Não usa st.*, então pode ser chamada de threads auxiliares. O mesmo conteúdo enviado
+    ao mesmo tempo por outra sessão é extraído uma única vez (o progresso só aparece para
+    quem iniciou a extração).
+    """
     file_extension = os.path.splitext(uploaded_file.name)[1].lower()
-    text_content = ""
-    try:
-        if file_extension == ".txt":
-            text_content = uploaded_file.read().decode("utf-8", errors="ignore")
-        elif file_extension == ".pdf":
-            reader = PdfReader(uploaded_file)
-            for page in reader.pages:
-                text_content += page.extract_text() + "\n"
-        elif file_extension == ".docx":
-            doc = Document(uploaded_file)
-            for para in doc.paragraphs:
-                text_content += para.text + "\n"
-        else:
-            return None, f"Formato não suportado: {uploaded_file.name}"
-        return text_content.strip(), None
-    except Exception as e:
-        return None, f"Erro ao processar '{uploaded_file.name}': {str(e)}"
+    if file_extension not in (".txt", ".pdf", ".docx"):
+        return None, f"Formato não suportado: {uploaded_file.name}"
+    chave_cache = chave_cache_extracao(uploaded_file, file_extension)
+    if cache is not None:
+        entrada_cache = cache.obter(chave_cache)
+        if entrada_cache is not None:
+            return entrada_cache.valor, None
+
+    def extrair():
+        try:
+            text_content = "".join(
+                iterar_texto_arquivo(uploaded_file, file_extension, pool=pool, ao_progredir=ao_progredir)).strip()
+            if cache is not None:
+                cache.gravar(chave_cache, text_content)
+            return text_content, None
+        except Exception as e:
+            return None, f"Erro ao processar '{uploaded_file.name}': {str(e)}"
+
+    resultado, _ = obter_coalescedor().executar("extracao", chave_cache, extrair)
+    return resultado
 
 
 # --- Funções de API ---
-def transcribe_with_groq(api_key, audio_file_bytes, original_filename):
-    if not api_key:
-        st.error("Chave API da Groq não configurada em .streamlit/secrets.toml. Necessária para transcrição.")
-        return None  # Modificado para retornar None explicitamente
+def ganchos_limites_groq(modelo, tokens=0, prioridade=PRIORIDADE_CHAT, sessao=None, ao_aguardar=None):
+    """
+    Argumentos para ClienteHttp.requisitar que fazem cada tentativa aguardar a vez no
+    agendador de limites da Groq (compartilhado pelo processo) e atualizá-lo com os
+    cabeçalhos x-ratelimit-* da resposta.
+    """
+    agendador = obter_agendador_groq()
+    return {
+        "antes_de_tentar": lambda: agendador.aguardar_vez(modelo, tokens, prioridade, sessao, ao_aguardar),
+        "ao_responder": lambda resposta: agendador.registrar_resposta(modelo, resposta.headers, resposta.status_code),
+    }
+
+
+def mensagem_espera_groq(espera_s, na_frente):
+    detalhe = f"; {na_frente} chamada(s) na frente" if na_frente else ""
+    return f"⏳ Limite de uso da Groq atingido: aguardando a vez (~{espera_s:.0f}s{detalhe})..."
+
+
+def chave_cache_transcricao(audio_file_bytes):
+    # O mesmo áudio com outro modelo ou idioma é outra transcrição
+    hash_audio = hashlib.sha256(audio_file_bytes).hexdigest()
+    return json.dumps([hash_audio, SELECTED_TRANSCRIPTION_MODEL, TRANSCRICAO_IDIOMA])
+
 
+def transcrever_audio_groq(api_key, audio_file_bytes, original_filename, cache=None, sessao=None, ao_aguardar=None):
+    """
+    Transcreve um áudio na Groq. Retorna (texto, None) ou (None, mensagem de erro).
+    Com 'cache' (CacheDisco), áudios já transcritos não são reenviados. Se o limite de uso
+    da Groq estiver esgotado, aguarda a vez (com 'ao_aguardar', ver AgendadorGroq).
+    Não usa st.*, então pode ser chamada das threads da transcrição em paralelo. O mesmo
+    áudio enviado ao mesmo tempo por outra sessão é transcrito uma única vez.
+    """
+    if not api_key:
+        return None, "Chave API da Groq não configurada em .streamlit/secrets.toml. Necessária para transcrição."
+    chave_cache = chave_cache_transcricao(audio_file_bytes)
+    if cache is not None:
+        entrada_cache = cache.obter(chave_cache)
+        if entrada_cache is not None:
+            return entrada_cache.valor, None
+    resultado, _ = obter_coalescedor().executar("transcricao", chave_cache, _enviar_transcricao_groq, api_key,
+                                                audio_file_bytes, original_filename, cache, chave_cache,
+                                                sessao, ao_aguardar)
+    return resultado
+
+
+def _enviar_transcricao_groq(api_key, audio_file_bytes, original_filename, cache, chave_cache, sessao, ao_aguardar):
     headers = {"Authorization": f"Bearer {api_key}"}
-    files = {"file": (original_filename, audio_file_bytes, "audio/mpeg")}
-    data = {"model": SELECTED_TRANSCRIPTION_MODEL, "language": "pt"}
+    mime_type = mimetypes.guess_type(original_filename)[0] or "application/octet-stream"
+    files = {"file": (original_filename, audio_file_bytes, mime_type)}
+    data = {"model": SELECTED_TRANSCRIPTION_MODEL, "language": TRANSCRICAO_IDIOMA}
 
     try:
-        response = requests.post(GROQ_API_TRANSCRIPTIONS_ENDPOINT, headers=headers, files=files, data=data)
+        response = obter_cliente_http().post(
+            GROQ_API_TRANSCRIPTIONS_ENDPOINT, headers=headers, files=files, data=data, timeout=TIMEOUT_TRANSCRICAO,
+            **ganchos_limites_groq(SELECTED_TRANSCRIPTION_MODEL, prioridade=PRIORIDADE_TRANSCRICAO, sessao=sessao,
+                                   ao_aguardar=ao_aguardar))
         response.raise_for_status()
         try:
-            return response.json()["text"]
+            transcription = response.json()["text"]
         except requests.exceptions.JSONDecodeError:
-            return response.text
+            transcription = response.text
+        if cache is not None and transcription:
+            cache.gravar(chave_cache, transcription)
+        return transcription, None
     except requests.exceptions.HTTPError as http_err:
-        st.error(f"Transcrição ({original_filename}) - Erro HTTP: {http_err} - {response.text}")
+        return None, f"Transcrição ({original_filename}) - Erro HTTP: {http_err} - {response.text}"
     except requests.exceptions.RequestException as req_err:
-        st.error(f"Transcrição ({original_filename}) - Erro na requisição: {req_err}")
+        return None, f"Transcrição ({original_filename}) - Erro na requisição: {req_err}"
     except Exception as e:
-        st.error(f"Transcrição ({original_filename}) - Erro inesperado: {e}")
-    return None
-
-
-def query_chatvolt_agent(api_key, agent_id, query, conversation_id=None, visitor_id=None):
-    if not api_key or not agent_id:
-        st.error("Chatvolt - Chave API ou ID do Agente não configurados em .streamlit/secrets.toml.")
-        return None
-    url = f"{CHATVOLT_API_BASE_URL}/{agent_id}/query"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-    }
-    data = {"query": query, "streaming": False}
-    if conversation_id:
-        data["conversationId"] = conversation_id
-    if visitor_id:
-        data["visitorId"] = visitor_id
-    try:
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.HTTPError as http_err:
-        st.error(f"Chatvolt - Erro HTTP: {http_err} - {response.text}")
-        return None
-    except Exception as err:
-        st.error(f"Chatvolt - Outro erro: {err}")
-        return None
+        return None, f"Transcrição ({original_filename}) - Erro inesperado: {e}"
 
 
 @st.cache_data(ttl=3600)
@@ -203,7 +308,7 @@ def get_groq_models(api_key):
     url = f"{GROQ_API_BASE_URL}/models"
     headers = {"Authorization": f"Bearer {api_key}"}
     try:
-        response = requests.get(url, headers=headers)
+        response = obter_cliente_http().get(url, headers=headers, timeout=TIMEOUT_MODELOS)
         response.raise_for_status()
         models_data = response.json()
         available_models = [model['id'] for model in models_data.get('data', []) if model.get('id')]
@@ -221,32 +326,447 @@ def get_groq_models(api_key):
         return []  # Retorna lista vazia para outros erros
 
 
-def query_groq_api(api_key, model_id, messages_history):
+def chave_cache_resposta(backend, modelo, temperatura, mensagens):
+    # Diferenças só de espaços e quebras de linha (ex.: fatos colados de novo) não mudam a resposta
+    normalizadas = [[msg["role"], " ".join(msg["content"].split())] for msg in mensagens]
+    hash_mensagens = hashlib.sha256(json.dumps(normalizadas, ensure_ascii=False).encode("utf-8")).hexdigest()
+    return json.dumps([backend, modelo, temperatura, hash_mensagens])
+
+
+def consultar_groq(api_key, model_id, messages_history, cache=None, prioridade=PRIORIDADE_CHAT, sessao=None,
+                   ao_aguardar=None):
+    """
+    Chamada à Groq sem streaming e sem chamadas ao Streamlit (para threads). Retorna (texto, erro).
+    Com 'cache', respostas a históricos idênticos são reaproveitadas. A chamada passa pelo
+    agendador de limites da Groq ('prioridade', 'sessao' e 'ao_aguardar': ver AgendadorGroq).
+    """
     if not api_key or not model_id:
-        st.error("Groq - Chave API não configurada em .streamlit/secrets.toml ou Modelo não selecionado.")
-        return None
+        return None, "Groq - Chave API não configurada em .streamlit/secrets.toml ou Modelo não selecionado."
+    chave = chave_cache_resposta("groq", model_id, GROQ_TEMPERATURA, messages_history)
+    entrada = cache.obter(chave) if cache is not None else None
+    if entrada is not None:
+        return entrada.valor["texto"], None
     url = f"{GROQ_API_BASE_URL}/chat/completions"
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json",
     }
-    data = {"model": model_id, "messages": messages_history, "temperature": 0.7}
+    data = {"model": model_id, "messages": messages_history, "temperature": GROQ_TEMPERATURA}
+    tokens = tokens_das_mensagens(messages_history) + GROQ_TOKENS_RESPOSTA_ESTIMADOS
     try:
-        response = requests.post(url, headers=headers, json=data)
+        response = obter_cliente_http().post(url, headers=headers, json=data, timeout=TIMEOUT_CHAT,
+                                             **ganchos_limites_groq(model_id, tokens, prioridade, sessao, ao_aguardar))
         response.raise_for_status()
-        return response.json()
+        texto = response.json()["choices"][0]["message"]["content"]
+        if cache is not None and texto:
+            cache.gravar(chave, {"texto": texto, "metadados": {}})
+        return texto, None
     except requests.exceptions.HTTPError as http_err:
-        st.error(f"Groq - Erro HTTP: {http_err} - {response.text}")
-        return None
+        return None, f"Groq - Erro HTTP: {http_err} - {response.text}"
+    except Exception as err:
+        return None, f"Groq - Outro erro: {err}"
+
+
+def stream_chatvolt_agent(api_key, agent_id, query, metadados, conversation_id=None, visitor_id=None):
+    """
+    Consulta o agente do Chatvolt em streaming: gera os pedaços da resposta à medida que
+    chegam (SSE), para uso com st.write_stream. Ao final, 'metadados' recebe os campos da
+    resposta completa (conversationId, visitorId, messageId, sources, answer) ou "erro".
+    """
+    if not api_key or not agent_id:
+        metadados["erro"] = "Chatvolt - Chave API ou ID do Agente não configurados em .streamlit/secrets.toml."
+        return
+    url = f"{CHATVOLT_API_BASE_URL}/{agent_id}/query"
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "Accept": "text/event-stream",
+    }
+    data = {"query": query, "streaming": True}
+    if conversation_id:
+        data["conversationId"] = conversation_id
+    if visitor_id:
+        data["visitorId"] = visitor_id
+    try:
+        with obter_cliente_http().post(url, headers=headers, json=data, timeout=TIMEOUT_CHAT, stream=True) as response:
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as http_err:
+                # O corpo (com a mensagem de erro da API) precisa ser lido antes de o 'with' fechar a resposta
+                metadados["erro"] = f"Chatvolt - Erro HTTP: {http_err} - {response.text}"
+                return
+            for evento, dados in iterar_eventos_sse(response):
+                if dados == "[DONE]":
+                    break
+                if evento == "endpoint_response":
+                    # Último evento: a resposta completa com os identificadores da conversa e as fontes
+                    metadados.update(json.loads(dados))
+                elif dados:
+                    yield dados
     except Exception as err:
-        st.error(f"Groq - Outro erro: {err}")
+        metadados["erro"] = f"Chatvolt - Outro erro: {err}"
+
+
+def stream_groq_api(api_key, model_id, messages_history, metadados, sessao=None, ao_aguardar=None):
+    """
+    Consulta a Groq em streaming: gera os pedaços da resposta à medida que chegam
+    (SSE no formato da OpenAI), para uso com st.write_stream. Ao final, 'metadados'
+    recebe o "id" da resposta ou "erro". Com o limite de uso da Groq esgotado, aguarda a
+    vez com prioridade de chat ('ao_aguardar': ver AgendadorGroq).
+    """
+    if not api_key or not model_id:
+        metadados["erro"] = "Groq - Chave API não configurada em .streamlit/secrets.toml ou Modelo não selecionado."
+        return
+    url = f"{GROQ_API_BASE_URL}/chat/completions"
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+    }
+    data = {"model": model_id, "messages": messages_history, "temperature": GROQ_TEMPERATURA, "stream": True}
+    tokens = tokens_das_mensagens(messages_history) + GROQ_TOKENS_RESPOSTA_ESTIMADOS
+    try:
+        with obter_cliente_http().post(url, headers=headers, json=data, timeout=TIMEOUT_CHAT, stream=True,
+                                       **ganchos_limites_groq(model_id, tokens, PRIORIDADE_CHAT, sessao,
+                                                              ao_aguardar)) as response:
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as http_err:
+                # O corpo (com a mensagem de erro da API) precisa ser lido antes de o 'with' fechar a resposta
+                metadados["erro"] = f"Groq - Erro HTTP: {http_err} - {response.text}"
+                return
+            for _, dados in iterar_eventos_sse(response):
+                if dados == "[DONE]":
+                    break
+                pedaco = json.loads(dados)
+                if "error" in pedaco:
+                    metadados["erro"] = f"Groq - Erro: {pedaco['error'].get('message', '')}"
+                    break
+                if pedaco.get("id"):
+                    metadados["id"] = pedaco["id"]
+                for escolha in pedaco.get("choices", []):
+                    conteudo = (escolha.get("delta") or {}).get("content")
+                    if conteudo:
+                        yield conteudo
+    except Exception as err:
+        metadados["erro"] = f"Groq - Outro erro: {err}"
+
+
+# --- Worker de Jurisprudência ---
+class WorkerJurisprudencia:
+    """
+    Mantém um processo 'jurisprudencia.py --worker' vivo (com o Chrome já aberto)
+    e o reutiliza entre buscas. O processo é reiniciado se morrer ou travar.
+    """
+
+    def __init__(self, script_path=JURISPRUDENCIA_SCRIPT_PATH, modo_rapido=JURISPRUDENCIA_MODO_RAPIDO,
+                 backend=JURISPRUDENCIA_BACKEND):
+        self.script_path = script_path
+        self.modo_rapido = modo_rapido
+        self.backend = backend
+        self.processo = None
+        self.saida = None
+        self.buscas_realizadas = 0
+        self.lock = threading.Lock()
+        atexit.register(self.encerrar)
+
+    def _iniciar(self):
+        comando = [sys.executable, self.script_path, "--worker", "--backend", self.backend]
+        if self.modo_rapido:
+            comando.append("--rapido")
+        self.processo = subprocess.Popen(
+            comando,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            text=True, encoding='utf-8', bufsize=1
+        )
+        # Lê stdout em uma thread separada para permitir timeout na espera da resposta
+        self.saida = queue.Queue()
+        threading.Thread(target=self._ler_saida, args=(self.processo, self.saida), daemon=True).start()
+
+    @staticmethod
+    def _ler_saida(processo, saida):
+        for linha in processo.stdout:
+            saida.put(linha)
+        saida.put(None)  # EOF: o processo terminou
+
+    def _vivo(self):
+        return self.processo is not None and self.processo.poll() is None
+
+    def encerrar(self):
+        if self.processo is None:
+            return
+        try:
+            if self.processo.poll() is None:
+                self.processo.stdin.write(json.dumps({"comando": "sair"}) + "\n")
+                self.processo.stdin.flush()
+                self.processo.wait(timeout=10)
+        except Exception:
+            self.processo.kill()
+        self.processo = None
+        self.buscas_realizadas = 0
+
+    def saudavel(self, timeout=10):
+        """Envia um ping ao worker. Um worker ainda não iniciado é considerado saudável."""
+        with self.lock:
+            if not self._vivo():
+                return True
+            try:
+                self.processo.stdin.write(json.dumps({"comando": "ping"}) + "\n")
+                self.processo.stdin.flush()
+                linha = self.saida.get(timeout=timeout)
+                return linha is not None and json.loads(linha).get("ok", False)
+            except Exception:
+                return False
+
+    @staticmethod
+    def _resultado_do_evento(evento):
+        """Converte um evento NDJSON do worker de volta ao formato de resultado (Decisao ou aviso/erro)."""
+        if evento.get("tipo") == "resultado":
+            return resultados_de_dicts([evento.get("resultado", {})])[0]
+        if evento.get("tipo") == "erro":
+            return {evento.get("chave", "erro_inesperado"): evento.get("mensagem", "")}
+        if evento.get("tipo") == "info":
+            return {"info": evento.get("mensagem", "")}
         return None
 
+    def iterar_busca(self, termo, max_resultados=3, timeout=JURISPRUDENCIA_TIMEOUT_S, ao_progredir=None):
+        """
+        Gera cada resultado (ou aviso/erro) assim que o worker o envia.
+        'ao_progredir(mensagem)' recebe os eventos de progresso do worker.
+        'timeout' é o tempo máximo de espera entre duas mensagens do worker.
+        """
+        requisicao = json.dumps({"termo": termo, "max_resultados": max_resultados}, ensure_ascii=False)
+        with self.lock:
+            concluida = False
+            try:
+                # Uma segunda tentativa cobre o caso de o worker ter morrido entre duas buscas
+                for _ in range(2):
+                    if not self._vivo():
+                        self._iniciar()
+                    try:
+                        self.processo.stdin.write(requisicao + "\n")
+                        self.processo.stdin.flush()
+                    except OSError:
+                        self.processo.kill()
+                        self.processo = None
+                        continue
+                    recebeu_resultados = False
+                    while True:
+                        try:
+                            linha = self.saida.get(timeout=timeout)
+                        except queue.Empty:
+                            yield {"erro_timeout": "Busca excedeu o tempo limite."}
+                            return
+                        if linha is None:
+                            self.processo = None
+                            break
+                        try:
+                            evento = json.loads(linha)
+                        except json.JSONDecodeError:
+                            yield {"erro_json_decode": f"Falha na decodificação JSON. Resposta: {linha}"}
+                            return
+                        if evento.get("tipo") == "fim":
+                            self.buscas_realizadas += 1
+                            concluida = True
+                            return
+                        if evento.get("tipo") == "progresso":
+                            if ao_progredir:
+                                ao_progredir(evento.get("mensagem", ""))
+                            continue
+                        resultado = self._resultado_do_evento(evento)
+                        if resultado is not None:
+                            recebeu_resultados = True
+                            yield resultado
+                    if recebeu_resultados:
+                        break  # Não repete a busca: parte dos resultados já foi entregue
+                concluida = True
+                yield {"erro_subprocess": "O processo de busca de jurisprudência encerrou inesperadamente."}
+            finally:
+                if not concluida and self._vivo():
+                    # Busca interrompida no meio: descarta o worker para não ler restos desta busca depois
+                    self.processo.kill()
+                    self.processo = None
+
+
+class PoolWorkersJurisprudencia:
+    """
+    Pool compartilhado por todas as sessões com no máximo 'tamanho' workers (um Chrome cada).
+    Sessões excedentes aguardam em uma fila FIFO. Antes de cada uso o worker passa por um
+    health check e é reciclado após 'max_buscas' buscas.
+    """
+
+    def __init__(self, tamanho=JURISPRUDENCIA_POOL_SIZE, max_buscas=JURISPRUDENCIA_MAX_BUSCAS_POR_NAVEGADOR):
+        self.max_buscas = max_buscas
+        self.livres = [WorkerJurisprudencia() for _ in range(tamanho)]
+        self.fila = collections.deque()
+        self.condicao = threading.Condition()
+
+    def _adquirir(self, ao_aguardar=None):
+        ticket = object()
+        with self.condicao:
+            self.fila.append(ticket)
+            ultima_posicao = None
+            try:
+                while self.fila[0] is not ticket or not self.livres:
+                    posicao = self.fila.index(ticket) + 1
+                    if ao_aguardar and posicao != ultima_posicao:
+                        ao_aguardar(posicao)
+                        ultima_posicao = posicao
+                    self.condicao.wait(timeout=1)
+                self.fila.popleft()
+                worker = self.livres.pop()
+            except BaseException:
+                # Sessão interrompida (ex.: rerun do Streamlit) enquanto aguardava na fila
+                self.fila.remove(ticket)
+                self.condicao.notify_all()
+                raise
+            self.condicao.notify_all()
+        if worker.buscas_realizadas >= self.max_buscas or not worker.saudavel():
+            worker.encerrar()  # Será reiniciado com um Chrome novo na próxima busca
+        return worker
+
+    def _liberar(self, worker):
+        with self.condicao:
+            self.livres.append(worker)
+            self.condicao.notify_all()
+
+    @contextmanager
+    def reservar(self, ao_aguardar=None):
+        """Reserva um worker do pool. 'ao_aguardar(posicao)' é chamado quando a posição na fila muda."""
+        worker = self._adquirir(ao_aguardar)
+        try:
+            yield worker
+        finally:
+            self._liberar(worker)
+
+
+@st.cache_resource
+def get_pool_jurisprudencia():
+    return PoolWorkersJurisprudencia()
+
+
+@st.cache_resource
+def get_cache_jurisprudencia():
+    return CacheDisco(os.path.join(CACHE_DIR, "jurisprudencia.sqlite3"), ttl_s=JURISPRUDENCIA_CACHE_TTL_S,
+                      max_bytes=JURISPRUDENCIA_CACHE_MAX_MB * 1024 * 1024)
+
+
+@st.cache_resource
+def get_pool_extracao():
+    try:
+        return criar_pool_extracao(EXTRACAO_MAX_PROCESSOS)
+    except (OSError, NotImplementedError):
+        return None  # Sem suporte a processos filhos: a extração segue página a página na thread
+
+
+@st.cache_resource
+def get_cache_extracao():
+    return CacheDisco(os.path.join(CACHE_DIR, "extracao.sqlite3"), max_bytes=EXTRACAO_CACHE_MAX_MB * 1024 * 1024)
+
+
+@st.cache_resource
+def get_cache_transcricoes():
+    return CacheDisco(os.path.join(CACHE_DIR, "transcricoes.sqlite3"), max_bytes=TRANSCRICAO_CACHE_MAX_MB * 1024 * 1024)
+
+
+@st.cache_resource
+def get_cache_respostas():
+    return CacheDisco(os.path.join(CACHE_DIR, "respostas.sqlite3"), ttl_s=RESPOSTAS_CACHE_TTL_S,
+                      max_bytes=RESPOSTAS_CACHE_MAX_MB * 1024 * 1024)
+
+
+@st.cache_resource
+def get_indice_jurisprudencia():
+    try:
+        return IndiceJurisprudencia(os.path.join(CACHE_DIR, "indice_jurisprudencia.sqlite3"))
+    except sqlite3.OperationalError:
+        return None  # SQLite sem FTS5: a busca segue direto para o TJGO
+
+
+def chave_cache_jurisprudencia(termo, max_resultados):
+    # "Dano  Moral" e "dano moral" são a mesma busca
+    termo_normalizado = " ".join(termo.casefold().split())
+    return json.dumps([termo_normalizado, max_resultados], ensure_ascii=False)
+
+
+def resultados_jurisprudencia_cacheaveis(resultados):
+    """Só vale guardar buscas que trouxeram decisões e nenhum erro."""
+    decisoes, avisos = separar_resultados(resultados)
+    return bool(decisoes) and not any(chave.startswith("erro") for aviso in avisos for chave in aviso)
+
+
+def buscar_jurisprudencia_em_camadas(termo, max_resultados, cache, indice, pool, forcar_atualizacao=False,
+                                     ao_aguardar=None, ao_reservar=None, ao_progredir=None, ao_resultado=None):
+    """
+    Busca em camadas: cache de resultados, índice local e, por último, o TJGO via pool de workers.
+    Retorna (resultados, origem, criado_em_cache, duracao_s); a duração não conta o tempo na fila.
+    Os resultados são Decisao, com avisos e erros como dicts (ver separar_resultados).
+    Não usa st.*, então pode rodar em threads auxiliares (busca em lote) se os callbacks também não usarem.
+    A busca no TJGO pode ser compartilhada com outras sessões: ela roda em uma thread própria e
+    os callbacks são chamados na thread de quem chamou, à medida que os eventos chegam.
+    """
+    chave_cache = chave_cache_jurisprudencia(termo, max_resultados)
+    inicio_busca = time.perf_counter()
+    entrada_cache = None if forcar_atualizacao else cache.obter(chave_cache)
+    if entrada_cache is not None:
+        return (resultados_de_dicts(entrada_cache.valor), "cache", entrada_cache.criado_em,
+                time.perf_counter() - inicio_busca)
+    if indice is not None and not forcar_atualizacao:
+        resultados_locais = indice.buscar(termo, max_resultados)
+        if len(resultados_locais) >= max_resultados:
+            # O índice local já tem todas as decisões pedidas: responde sem ir ao TJGO
+            return resultados_locais, "indice", None, time.perf_counter() - inicio_busca
+
+    def buscar_no_tjgo(publicar):
+        # Sem callbacks de sessão aqui: esta função roda uma vez para todas as sessões que fizeram a mesma busca
+        resultados_busca = []
+        with pool.reservar(ao_aguardar=lambda posicao: publicar("fila", posicao)) as worker:
+            publicar("reservado")
+            inicio = time.perf_counter()
+            for res in worker.iterar_busca(termo, max_resultados,
+                                           ao_progredir=lambda mensagem: publicar("progresso", mensagem)):
+                publicar("resultado", res)
+                resultados_busca.append(res)
+            duracao = time.perf_counter() - inicio
+        # Páginas chegam fora de ordem; mensagens sem 'id' (avisos/erros) ficam no final
+        resultados_busca.sort(key=lambda res: res.id if isinstance(res, Decisao) else res.get("id", float("inf")))
+        if resultados_jurisprudencia_cacheaveis(resultados_busca):
+            cache.gravar(chave_cache, resultados_para_dicts(resultados_busca))
+        if indice is not None:
+            indice.ingerir(resultados_busca, termo_origem=termo)
+        return resultados_busca, duracao
+
+    # A mesma busca já em andamento em outra sessão: acompanha a dela em vez de ocupar outro Chrome
+    execucao, _ = obter_coalescedor().transmitir("jurisprudencia", chave_cache, buscar_no_tjgo)
+    recebidos = 0
+    for tipo, valor in execucao.eventos():
+        if tipo == "fila" and ao_aguardar is not None:
+            ao_aguardar(valor)
+        elif tipo == "reservado" and ao_reservar is not None:
+            ao_reservar()
+        elif tipo == "progresso" and ao_progredir is not None:
+            ao_progredir(valor)
+        elif tipo == "resultado":
+            if ao_resultado is not None:
+                ao_resultado(valor, recebidos)
+            recebidos += 1
+    resultados_busca, duracao = execucao.resultado()
+    return list(resultados_busca), "tjgo", None, duracao
+
+
+def termos_lote_jurisprudencia(texto):
+    """Um termo por linha, sem linhas vazias nem repetições (ignorando maiúsculas e espaços extras)."""
+    termos = {}
+    for linha in texto.splitlines():
+        if linha.strip():
+            termos.setdefault(" ".join(linha.casefold().split()), linha.strip())
+    return list(termos.values())
+
 
 # --- Gerenciamento de Estado e Navegação ---
 def initialize_session_state():
     defaults = {
         "current_page": "input_fatos",
+        "id_sessao": uuid.uuid4().hex,  # Identifica a sessão na fila de chamadas à Groq (revezamento justo)
         "fatos_text": "",
         "fatos_text_buffer": st.session_state.get("fatos_text_buffer", ""),
         "selected_chat_type": None,
@@ -255,12 +775,25 @@ def initialize_session_state():
         "chatvolt_conversation_id": None,
         "chatvolt_visitor_id": None,
         "groq_messages": [],
+        "groq_resumo_historico": None,  # Resumo das mensagens antigas do Groq ({"ate", "texto"})
+        "indice_fatos": None,  # Índice BM25 dos fatos da conversa ({"hash", "indice"})
+        "cache_respostas_ativo": RESPOSTAS_CACHE_PADRAO,
+        "pergunta_a_regenerar": None,  # Pergunta cuja resposta foi descartada pelo botão "Regenerar"
+        "regenerar_resposta_inicial": False,
         # Chaves API e Agent ID não são mais armazenadas no session_state globalmente,
         # serão lidas de st.secrets e passadas via app_configs
         "selected_groq_model_global": st.session_state.get("selected_groq_model_global", None),
          # NOVOS ESTADOS PARA BUSCA DE JURISPRUDÊNCIA
         "termo_jurisprudencia": "",
-        "resultados_jurisprudencia": None,
+        "resultados_jurisprudencia": None,  # Lista de Decisao
+        "avisos_jurisprudencia": [],  # Avisos e erros da última busca
+        "tempo_busca_jurisprudencia": None,
+        "max_resultados_jurisprudencia": JURISPRUDENCIA_MAX_RESULTADOS,
+        "origem_jurisprudencia": None,  # "cache", "indice", "tjgo" ou "lote"
+        "modo_lote_jurisprudencia": False,
+        "termos_lote_jurisprudencia": "",
+        "cache_criado_em_jurisprudencia": None,
+        "forcar_atualizacao_jurisprudencia": False,
         "buscando_jurisprudencia": False  # Para controlar o spinner e a lógica de busca
     }
     for key, value in defaults.items():
@@ -279,6 +812,10 @@ def reset_all_chat_states():
     st.session_state.chatvolt_conversation_id = None
     st.session_state.chatvolt_visitor_id = None
     st.session_state.groq_messages = []
+    st.session_state.groq_resumo_historico = None
+    st.session_state.indice_fatos = None
+    st.session_state.pergunta_a_regenerar = None
+    st.session_state.regenerar_resposta_inicial = False
 
 
 def reset_for_new_fatos():
@@ -343,6 +880,34 @@ def render_sidebar(available_groq_models):
             st.info("Modelos Groq aparecerão aqui após configurar a chave API.") #
             st.session_state.selected_groq_model_global = None #
 
+        st.session_state.cache_respostas_ativo = st.toggle(
+            "Reutilizar respostas idênticas",
+            value=st.session_state.cache_respostas_ativo,
+            help="Os mesmos fatos e perguntas enviados ao mesmo modelo recebem a resposta já gerada, sem nova "
+                 "chamada à API. Use \"Regenerar\" em uma resposta para obter outra.",
+            key="toggle_cache_respostas"
+        )
+        if st.session_state.cache_respostas_ativo:
+            estatisticas = get_cache_respostas().estatisticas()
+            st.caption(f"{estatisticas['itens']} respostas em cache; "
+                       f"{estatisticas['acertos']} reaproveitadas ({estatisticas['taxa_acerto']:.0%}).")
+
+
+        limites = {modelo: dados for modelo, dados in obter_agendador_groq().estatisticas().items() if dados["atrasadas"]}
+        if limites:
+            with st.expander("Fila de chamadas à Groq", expanded=False):
+                for modelo, dados in limites.items():
+                    st.caption(f"{modelo}: {dados['atrasadas']} de {dados['liberadas']} chamada(s) aguardaram o limite "
+                               f"de uso (média de {dados['espera_media_s']:.1f}s); {dados['na_fila']} na fila agora.")
+
+        coalescencia = obter_coalescedor().estatisticas()
+        if any(grupo["compartilhadas"] for grupo in coalescencia.values()):
+            nomes = {"jurisprudencia": "Buscas no TJGO", "transcricao": "Transcrições", "extracao": "Extrações"}
+            with st.expander("Chamadas compartilhadas entre sessões", expanded=False):
+                for grupo, contadores in coalescencia.items():
+                    st.caption(f"{nomes.get(grupo, grupo)}: {contadores['executadas']} executadas, "
+                               f"{contadores['compartilhadas']} aproveitaram uma idêntica em andamento "
+                               f"({contadores['taxa_coalescencia']:.0%}).")
 
         st.markdown("---")
         st.header("Navegação Principal") # Novo subcabeçalho para clareza
@@ -360,7 +925,8 @@ def render_sidebar(available_groq_models):
         "groq_api_key": groq_api_key,
         "chatvolt_api_key": chatvolt_api_key,
         "chatvolt_agent_id": chatvolt_agent_id,
-        "selected_groq_model": st.session_state.selected_groq_model_global
+        "selected_groq_model": st.session_state.selected_groq_model_global,
+        "cache_respostas": get_cache_respostas() if st.session_state.cache_respostas_ativo else None
     }
 # ... (restante do código) ...
     with st.sidebar:
@@ -437,238 +1003,242 @@ def render_sidebar(available_groq_models):
         "selected_groq_model": st.session_state.selected_groq_model_global
     }
 
-# interface.py
-# ... (seu código existente) ...
-
-# No arquivo interface.py
-# ... (outras partes do código) ...
-
-def render_busca_jurisprudencia_page(app_configs):
-    st.title("⚖️ Busca de Jurisprudência - TJGO")
-    st.markdown("Insira o termo que deseja pesquisar na base de jurisprudência do TJGO.")
-
-    termo_busca_input = st.text_input(
-        "Termo de busca:",
-        value=st.session_state.get("termo_jurisprudencia", ""),
-        key="termo_jurisprudencia_input_key"
-    )
-    if termo_busca_input != st.session_state.get("termo_jurisprudencia"):
-        st.session_state.termo_jurisprudencia = termo_busca_input
-        # Um rerun aqui pode ser desnecessário se o botão de busca for a ação principal
-        # st.rerun()
-
-    if st.button("Buscar Jurisprudência", key="btn_buscar_jurisprudencia_action"):
-        if not st.session_state.termo_jurisprudencia.strip():
-            st.warning("Por favor, insira um termo para a busca.")
-        else:
-            # Não fazer rerun aqui. Deixar o spinner controlar a próxima renderização.
-            st.session_state.buscando_jurisprudencia = True
-            st.session_state.resultados_jurisprudencia = None
-            # st.rerun() # REMOVER ESTE RERUN
 
-    if st.session_state.get("buscando_jurisprudencia"):
-        termo_para_busca = st.session_state.termo_jurisprudencia
-        # Usar st.status para uma melhor experiência com o spinner
-        with st.status(f"Buscando jurisprudência para: '{termo_para_busca}'...", expanded=True) as status_ui:
-            try:
-                st.write(f"Iniciando busca no TJGO para: {termo_para_busca}")
-                script_path = os.path.join(os.path.dirname(__file__), 'jurisprudencia.py')
-                if not os.path.exists(script_path):
-                    st.error(f"Script 'jurisprudencia.py' não encontrado em: {script_path}")
-                    st.session_state.resultados_jurisprudencia = [{"erro_interno": "jurisprudencia.py não encontrado."}]
-                else:
-                    process = subprocess.run(
-                        [sys.executable, script_path, termo_para_busca],
-                        capture_output=True, text=True, check=False, encoding='utf-8', timeout=120
-                    )
-                    if process.returncode != 0:
-                        st.error(f"Script de busca falhou. Erro: {process.stderr}")
-                        st.session_state.resultados_jurisprudencia = [{"erro_subprocess": f"Erro script: {process.stderr}"}]
-                    else:
-                        resultados_raw = process.stdout
-                        try:
-                            resultados_json = json.loads(resultados_raw)
-                            st.session_state.resultados_jurisprudencia = resultados_json
-                            st.write("Busca concluída. Processando resultados...")
-                        except json.JSONDecodeError:
-                            st.error(f"Erro ao decodificar JSON do script: {resultados_raw}")
-                            st.session_state.resultados_jurisprudencia = [{"erro_json_decode": f"Falha JSON: {resultados_raw}"}]
-                status_ui.update(label="Busca finalizada!", state="complete")
+def _render_resultado_jurisprudencia(decisao, i, prefixo_chave="juris_text"):
+    numero = decisao.id if decisao.id is not None else i + 1
+    st.markdown(f"--- **Resultado {numero}** ---")
+    if decisao.termos:
+        st.caption("Encontrada em: " + ", ".join(f"'{termo}'" for termo in decisao.termos))
+    campos = [decisao.numero_processo, decisao.orgao_julgador, decisao.relator]
+    if decisao.data_julgamento:
+        campos.append("julgado em " + "/".join(reversed(decisao.data_julgamento.split("-"))))
+    if any(campos):
+        st.caption(" · ".join(campo for campo in campos if campo))
+    if decisao.link:
+        st.markdown(f"[Inteiro teor]({decisao.link})")
+    if decisao.trecho:
+        st.markdown(f"… {decisao.trecho} …")  # Trecho do índice local com os termos destacados
+    st.text_area(f"Jurisprudência {numero}:", value=decisao.texto, height=250, key=f"{prefixo_chave}_{i}", disabled=True)
 
-            except subprocess.TimeoutExpired:
-                st.error("A busca de jurisprudência demorou muito (timeout).")
-                st.session_state.resultados_jurisprudencia = [{"erro_timeout": "Busca excedeu o tempo limite."}]
-                status_ui.update(label="Timeout na busca!", state="error")
-            except FileNotFoundError: # Redundante se o check os.path.exists for feito
-                st.error("Erro: Script 'jurisprudencia.py' não encontrado.")
-                st.session_state.resultados_jurisprudencia = [{"erro_interno": "jurisprudencia.py não encontrado."}]
-                status_ui.update(label="Erro de arquivo!", state="error")
-            except Exception as e:
-                st.error(f"Erro inesperado na busca: {str(e)}")
-                st.session_state.resultados_jurisprudencia = [{"erro_inesperado": str(e)}]
-                status_ui.update(label="Erro inesperado!", state="error")
-            finally:
-                st.session_state.buscando_jurisprudencia = False
-                # O st.rerun() AQUI É O MAIS CRÍTICO A SER CONSIDERADO.
-                # Se a atualização do session_state for suficiente para o Streamlit
-                # re-renderizar a exibição dos resultados, este rerun pode não ser necessário
-                # ou pode ser a causa do problema "removeChild".
-                # Tente comentar este rerun primeiro. Se a UI não atualizar
-                # com os resultados, então ele pode ser necessário, mas pode precisar
-                # de uma lógica mais cuidadosa.
-                # st.rerun() # <= TENTE COMENTAR ESTE PRIMEIRO
-
-    # Exibe os resultados após a busca (esta parte permanece a mesma)
-    if not st.session_state.get("buscando_jurisprudencia") and st.session_state.get("resultados_jurisprudencia") is not None:
-        resultados = st.session_state.get("resultados_jurisprudencia")
-        st.subheader("Resultados da Busca:")
-        if isinstance(resultados, list) and resultados:
-            # ... (lógica de exibição de resultados existente) ...
-            has_actual_results = False
-            for i, res in enumerate(resultados):
-                error_keys = ["erro_driver", "erro_geral", "erro_subprocess", "erro_json_decode", "erro_interno", "erro_inesperado", "erro_timeout"]
-                found_error = False
-                for key_err in error_keys: # Renomear variável de loop para evitar conflito
-                    if key_err in res:
-                        st.error(f"Erro na busca: {res[key_err]}")
-                        if key_err == "erro_driver": st.info("Verifique Google Chrome / ChromeDriver.")
-                        found_error = True
-                        break
-                if found_error: continue
-
-                if "info" in res:
-                    st.info(res["info"])
-                    continue
-
-                has_actual_results = True
-                st.markdown(f"---")
-                with st.container(border=True): # 'border' é um bom parâmetro
-                    st.markdown(f"**Resultado {res.get('id', i+1)}**")
-                    if "texto" in res and res["texto"]:
-                        st.text_area(f"Conteúdo do Resultado {res.get('id', i+1)}:", value=res["texto"], height=200, key=f"juris_text_display_{res.get('id', i)}", disabled=True)
-                    elif "erro" in res:
-                        st.warning(f"Falha ao obter conteúdo do resultado {res.get('id', i+1)}: {res['erro']}")
-                    else:
-                        st.warning(f"Resultado {res.get('id', i+1)} em formato inesperado ou sem conteúdo.")
-            if not has_actual_results and not any("info" in r for r in resultados if isinstance(r, dict)):
-                 st.info("A busca foi concluída, mas não retornou jurisprudências ou houve apenas mensagens de erro.")
 
-        elif not resultados:
-             st.info("A busca não retornou dados.")
-        else:
-            st.warning("Formato de resultados da busca inesperado.")
+def _guardar_resultados_jurisprudencia(resultados):
+    # Decisões como Decisao (__slots__) e avisos/erros em uma lista à parte: a sessão não guarda dicts do protocolo
+    st.session_state.resultados_jurisprudencia, st.session_state.avisos_jurisprudencia = separar_resultados(resultados)
 
-    st.markdown("---")
-    if st.button("Voltar para Registro de Fatos", key="btn_juris_to_fatos"):
-        st.session_state.termo_jurisprudencia = ""
-        st.session_state.resultados_jurisprudencia = None
-        st.session_state.buscando_jurisprudencia = False
-        navigate_to("input_fatos")
-        st.rerun() # Este rerun para navegação é geralmente OK.
-# ... (restante do código) ...    st.title("⚖️ Busca de Jurisprudência - TJGO")
-    st.markdown("Insira o termo que deseja pesquisar na base de jurisprudência do TJGO.")
 
-# interface.py, aproximadamente na linha 572
 def render_busca_jurisprudencia_page(app_configs):
     st.title("⚖️ Busca de Jurisprudência - TJGO")
     st.markdown("Insira o termo que deseja pesquisar na base de jurisprudência do TJGO.")
 
-    termo_busca_input = st.text_input( # ESTE É O WIDGET CAUSANDO O ERRO
-        "Termo de busca:",
-        value=st.session_state.get("termo_jurisprudencia", ""),
-        key="termo_jurisprudencia_input_key" # ESTA CHAVE ESTÁ DUPLICADA
+    st.session_state.modo_lote_jurisprudencia = st.toggle(
+        "Busca em lote (um termo por linha)",
+        value=st.session_state.modo_lote_jurisprudencia,
+        help="Os termos são buscados em paralelo e as decisões repetidas aparecem uma única vez.",
+        key="modo_lote_jurisprudencia_toggle"
+    )
+    if st.session_state.modo_lote_jurisprudencia:
+        st.session_state.termos_lote_jurisprudencia = st.text_area(
+            "Termos de busca (um por linha):",
+            value=st.session_state.termos_lote_jurisprudencia,
+            height=150,
+            key="termos_lote_jurisprudencia_input_key"
+        )
+    else:
+        termo_busca_input = st.text_input( # ESTE É O WIDGET CAUSANDO O ERRO
+            "Termo de busca:",
+            value=st.session_state.get("termo_jurisprudencia", ""),
+            key="termo_jurisprudencia_input_key" # ESTA CHAVE ESTÁ DUPLICADA
+        )
+        # ... restante da função ...
+        # Atualizar o estado da sessão se o valor do input mudar
+        if termo_busca_input != st.session_state.get("termo_jurisprudencia"):
+            st.session_state.termo_jurisprudencia = termo_busca_input
+            # st.rerun() # Pode não ser necessário aqui, depende da interatividade desejada
+
+    st.session_state.max_resultados_jurisprudencia = st.number_input(
+        "Quantidade de decisões:",
+        min_value=1,
+        max_value=JURISPRUDENCIA_MAX_RESULTADOS_LIMITE,
+        value=st.session_state.max_resultados_jurisprudencia,
+        help="Acima da primeira página, as páginas seguintes são buscadas em paralelo.",
+        key="max_resultados_jurisprudencia_input_key"
     )
-    # ... restante da função ...
-    # Atualizar o estado da sessão se o valor do input mudar
-    if termo_busca_input != st.session_state.get("termo_jurisprudencia"):
-        st.session_state.termo_jurisprudencia = termo_busca_input
-        # st.rerun() # Pode não ser necessário aqui, depende da interatividade desejada
 
     if st.button("Buscar Jurisprudência", key="btn_buscar_jurisprudencia_action"):
-        if not st.session_state.termo_jurisprudencia.strip():
+        if st.session_state.modo_lote_jurisprudencia and not termos_lote_jurisprudencia(st.session_state.termos_lote_jurisprudencia):
+            st.warning("Por favor, insira ao menos um termo (um por linha) para a busca em lote.")
+        elif not st.session_state.modo_lote_jurisprudencia and not st.session_state.termo_jurisprudencia.strip():
             st.warning("Por favor, insira um termo para a busca.")
         else:
             st.session_state.buscando_jurisprudencia = True
             st.session_state.resultados_jurisprudencia = None # Limpa resultados anteriores
+            st.session_state.tempo_busca_jurisprudencia = None
+            st.session_state.forcar_atualizacao_jurisprudencia = False
             st.rerun() # Para mostrar o spinner imediatamente
 
     if st.session_state.get("buscando_jurisprudencia"):
-        termo_para_busca = st.session_state.termo_jurisprudencia
-        with st.spinner(f"Buscando jurisprudência para: '{termo_para_busca}'... Aguarde, isso pode levar alguns instantes."):
+        modo_lote = st.session_state.modo_lote_jurisprudencia
+        if modo_lote:
+            termos_lote = termos_lote_jurisprudencia(st.session_state.termos_lote_jurisprudencia)
+            titulo_status = f"Buscando jurisprudência para {len(termos_lote)} termo(s) em lote... Aguarde, isso pode levar alguns instantes."
+        else:
+            termo_para_busca = st.session_state.termo_jurisprudencia
+            titulo_status = f"Buscando jurisprudência para: '{termo_para_busca}'... Aguarde, isso pode levar alguns instantes."
+        with st.status(titulo_status, expanded=True) as status_ui:
             try:
-                # Certifique-se que 'jurisprudencia.py' está no mesmo diretório
-                # Usar sys.executable para garantir que o mesmo interpretador Python seja usado
-                process = subprocess.run(
-                    [sys.executable, 'jurisprudencia.py', termo_para_busca],
-                    capture_output=True,
-                    text=True,
-                    check=True, # Lança CalledProcessError se o script retornar um código de erro
-                    encoding='utf-8' # Importante para caracteres especiais
-                )
-                resultados_raw = process.stdout
-                try:
-                    resultados_json = json.loads(resultados_raw)
-                    st.session_state.resultados_jurisprudencia = resultados_json
-                except json.JSONDecodeError:
-                    st.error(f"Erro ao decodificar a resposta JSON do script de jurisprudência. Resposta recebida:\n{resultados_raw}")
-                    st.session_state.resultados_jurisprudencia = [{"erro_json_decode": f"Falha na decodificação JSON. Resposta: {resultados_raw}"}]
-
-            except subprocess.CalledProcessError as e:
-                st.error("Ocorreu um erro ao executar a busca de jurisprudência.")
-                st.error(f"Detalhes do erro do script:\n{e.stderr}")
-                st.session_state.resultados_jurisprudencia = [{"erro_subprocess": f"Erro no script: {e.stderr}"}]
+                # O worker mantém o Chrome aberto entre buscas, evitando iniciar Python + Chrome a cada clique
+                if not os.path.exists(JURISPRUDENCIA_SCRIPT_PATH):
+                    raise FileNotFoundError(JURISPRUDENCIA_SCRIPT_PATH)
+
+                # Recursos obtidos aqui, na thread do script: as threads do lote não podem chamar st.*
+                cache = get_cache_jurisprudencia()
+                indice = get_indice_jurisprudencia()
+                pool = get_pool_jurisprudencia()
+                forcar_atualizacao = st.session_state.forcar_atualizacao_jurisprudencia
+                max_resultados = st.session_state.max_resultados_jurisprudencia
+
+                if modo_lote:
+                    inicio_lote = time.perf_counter()
+                    resultados_por_termo = {}
+                    with ThreadPoolExecutor(max_workers=JURISPRUDENCIA_LOTE_CONCORRENCIA) as executor:
+                        futuros = {
+                            executor.submit(buscar_jurisprudencia_em_camadas, termo, max_resultados, cache, indice, pool,
+                                            forcar_atualizacao): termo
+                            for termo in termos_lote
+                        }
+                        for concluidos, futuro in enumerate(as_completed(futuros), 1):
+                            termo = futuros[futuro]
+                            try:
+                                resultados_termo, origem_termo, _, duracao_termo = futuro.result()
+                                decisoes_termo = len(separar_resultados(resultados_termo)[0])
+                                st.write(f"✔️ '{termo}': {decisoes_termo} decisão(ões) ({origem_termo}, {duracao_termo:.2f}s)")
+                            except Exception as e:
+                                resultados_termo = [{"erro_inesperado": str(e)}]
+                                st.write(f"❌ '{termo}': {str(e)}")
+                            resultados_por_termo[termo] = resultados_termo
+                            status_ui.update(label=f"Lote: {concluidos} de {len(termos_lote)} termo(s) concluído(s)...")
+                    # A ordem digitada desempata o ranking de forma previsível
+                    _guardar_resultados_jurisprudencia(mesclar_resultados_lote(
+                        {termo: resultados_por_termo[termo] for termo in termos_lote}))
+                    st.session_state.origem_jurisprudencia = "lote"
+                    st.session_state.cache_criado_em_jurisprudencia = None
+                    st.session_state.tempo_busca_jurisprudencia = time.perf_counter() - inicio_lote
+                else:
+                    def mostrar_posicao_fila(posicao):
+                        status_ui.update(label=f"Todos os navegadores estão ocupados. Posição na fila: {posicao}")
+
+                    def mostrar_inicio_busca():
+                        status_ui.update(label=f"Buscando jurisprudência para: '{termo_para_busca}'...")
+
+                    recebidos = []
+                    def mostrar_progresso(mensagem):
+                        status_ui.update(label=f"{mensagem} ({len(recebidos)} de até {max_resultados} recebido(s))")
+
+                    def mostrar_resultado(res, posicao):
+                        # Mostra cada resultado assim que chega, enquanto os demais carregam
+                        if isinstance(res, Decisao):
+                            _render_resultado_jurisprudencia(res, posicao, prefixo_chave="juris_parcial")
+                        recebidos.append(res)
+
+                    resultados, origem, criado_em, duracao = buscar_jurisprudencia_em_camadas(
+                        termo_para_busca, max_resultados, cache, indice, pool, forcar_atualizacao,
+                        ao_aguardar=mostrar_posicao_fila, ao_reservar=mostrar_inicio_busca,
+                        ao_progredir=mostrar_progresso, ao_resultado=mostrar_resultado)
+                    _guardar_resultados_jurisprudencia(resultados)
+                    st.session_state.origem_jurisprudencia = origem
+                    st.session_state.cache_criado_em_jurisprudencia = criado_em
+                    st.session_state.tempo_busca_jurisprudencia = duracao
+                status_ui.update(label="Busca finalizada!", state="complete")
+
             except FileNotFoundError:
                 st.error("Erro: O script 'jurisprudencia.py' não foi encontrado. Certifique-se de que ele está no mesmo diretório que esta aplicação.")
-                st.session_state.resultados_jurisprudencia = [{"erro_interno": "Script jurisprudencia.py não encontrado."}]
+                _guardar_resultados_jurisprudencia([{"erro_interno": "Script jurisprudencia.py não encontrado."}])
+                status_ui.update(label="Erro de arquivo!", state="error")
             except Exception as e:
                 st.error(f"Um erro inesperado ocorreu durante a busca: {str(e)}")
-                st.session_state.resultados_jurisprudencia = [{"erro_inesperado": str(e)}]
+                _guardar_resultados_jurisprudencia([{"erro_inesperado": str(e)}])
+                status_ui.update(label="Erro inesperado!", state="error")
             finally:
                 st.session_state.buscando_jurisprudencia = False
+                st.session_state.forcar_atualizacao_jurisprudencia = False
                 st.rerun() # Para exibir os resultados ou erros e remover o spinner
 
     # Exibe os resultados após a busca
     if not st.session_state.get("buscando_jurisprudencia") and st.session_state.get("resultados_jurisprudencia") is not None:
-        resultados = st.session_state.get("resultados_jurisprudencia")
+        decisoes = st.session_state.resultados_jurisprudencia
+        avisos = st.session_state.get("avisos_jurisprudencia") or []
         st.subheader("Resultados da Busca:")
-        if isinstance(resultados, list) and resultados:
-            for i, res in enumerate(resultados):
-                # Verifica os tipos de erro primeiro
-                if "erro_driver" in res:
-                    st.error(f"Erro Crítico na Busca (WebDriver): {res['erro_driver']}")
-                    st.info("Verifique se o Google Chrome está instalado e se não há problemas com o ChromeDriver.")
-                    break
-                if "erro_geral" in res:
-                    st.error(f"Erro Geral na Busca: {res['erro_geral']}")
-                    break
-                if "erro_subprocess" in res:
-                    st.error(f"Erro na Execução do Script de Busca: {res['erro_subprocess']}")
-                    break
-                if "erro_json_decode" in res:
-                    st.error(f"Erro Interno (JSON Decode): {res['erro_json_decode']}")
-                    break
-                if "erro_interno" in res: # Erros como FileNotFoundError
-                    st.error(f"Erro Interno: {res['erro_interno']}")
-                    break
-                if "erro_inesperado" in res:
-                    st.error(f"Erro Inesperado: {res['erro_inesperado']}")
-                    break
-                if "info" in res: # Mensagens informativas como "nenhum resultado"
-                    st.info(res["info"])
-                    break
-
-                # Se chegou aqui, é um resultado válido ou um erro de processamento de bloco
-                st.markdown(f"--- **Resultado {res.get('id', i+1)}** ---")
-                if "texto" in res and res["texto"]:
-                    st.text_area(f"Jurisprudência {res.get('id', i+1)}:", value=res["texto"], height=250, key=f"juris_text_{i}", disabled=True)
-                elif "erro" in res: # Erro específico ao processar um bloco
-                    st.warning(f"Falha ao processar o conteúdo do resultado {res.get('id', i+1)}: {res['erro']}")
-                else: # Caso algum resultado venha em formato inesperado, sem 'texto' ou 'erro'
-                    st.warning(f"Resultado {res.get('id', i+1)} em formato inesperado ou sem conteúdo.")
-        elif not resultados: # Lista vazia, pode acontecer se o script retornar []
-             st.info("A busca não retornou resultados ou a lista de resultados está vazia.")
-        else: # Não é lista ou é None (embora a lógica acima deva cobrir None)
-            st.warning("Formato de resultados da busca inesperado.")
+        if st.session_state.get("tempo_busca_jurisprudencia") is not None:
+            if st.session_state.get("origem_jurisprudencia") == "lote":
+                st.caption(f"Tempo total do lote: {st.session_state.tempo_busca_jurisprudencia:.2f}s")
+            else:
+                st.caption(f"Tempo da busca: {st.session_state.tempo_busca_jurisprudencia:.2f}s (sem contar a fila)")
+        if st.session_state.get("origem_jurisprudencia") == "cache":
+            salvo_ha_min = (time.time() - st.session_state.cache_criado_em_jurisprudencia) / 60
+            st.caption(f"⚡ Resultado do cache (salvo há {salvo_ha_min:.0f} min)")
+        elif st.session_state.get("origem_jurisprudencia") == "indice":
+            st.caption("📚 Resultados do índice local de decisões já consultadas (ranking BM25)")
+        elif st.session_state.get("origem_jurisprudencia") == "tjgo":
+            st.caption("🌐 Resultado obtido agora no TJGO")
+        elif st.session_state.get("origem_jurisprudencia") == "lote":
+            st.caption("🗂️ Resultados mesclados do lote, ordenados pelo número de termos que encontraram cada decisão")
+        if st.button("🔄 Forçar atualização", key="btn_forcar_atualizacao_jurisprudencia",
+                     help="Ignora o cache e o índice local e busca novamente no TJGO."):
+            st.session_state.buscando_jurisprudencia = True
+            st.session_state.resultados_jurisprudencia = None
+            st.session_state.tempo_busca_jurisprudencia = None
+            st.session_state.forcar_atualizacao_jurisprudencia = True
+            st.rerun()
+        indice = get_indice_jurisprudencia()
+        if indice is not None:
+            st.caption(f"Índice local: {indice.total()} decisões")
+        if decisoes:
+            arquivo_parquet = BytesIO()
+            exportar_parquet(decisoes, arquivo_parquet)
+            st.download_button(
+                label="📊 Baixar decisões (Parquet)",
+                data=arquivo_parquet.getvalue(),
+                file_name="decisoes_tjgo.parquet",
+                mime="application/vnd.apache.parquet",
+                key="btn_download_parquet_jurisprudencia"
+            )
+        for i, decisao in enumerate(decisoes):
+            _render_resultado_jurisprudencia(decisao, i)
+        for res in avisos:
+            # Verifica os tipos de erro primeiro
+            if "erro_driver" in res:
+                st.error(f"Erro Crítico na Busca (WebDriver): {res['erro_driver']}")
+                st.info("Verifique se o Google Chrome está instalado e se não há problemas com o ChromeDriver.")
+                break
+            if "erro_geral" in res:
+                st.error(f"Erro Geral na Busca: {res['erro_geral']}")
+                break
+            if "erro_subprocess" in res:
+                st.error(f"Erro na Execução do Script de Busca: {res['erro_subprocess']}")
+                break
+            if "erro_json_decode" in res:
+                st.error(f"Erro Interno (JSON Decode): {res['erro_json_decode']}")
+                break
+            if "erro_interno" in res: # Erros como FileNotFoundError
+                st.error(f"Erro Interno: {res['erro_interno']}")
+                break
+            if "erro_inesperado" in res:
+                st.error(f"Erro Inesperado: {res['erro_inesperado']}")
+                break
+            if "erro_timeout" in res:
+                st.error(f"Tempo Esgotado: {res['erro_timeout']}")
+                break
+            if "info" in res: # Mensagens informativas como "nenhum resultado"
+                st.info(res["info"])
+                if st.session_state.get("origem_jurisprudencia") == "lote":
+                    continue  # No lote, cada termo pode ter o seu aviso
+                break
+            if "erro" in res: # Erro específico ao processar um bloco
+                st.warning(f"Falha ao processar o conteúdo do resultado {res.get('id', '?')}: {res['erro']}")
+            else: # Caso algum item venha em formato inesperado
+                st.warning("Resultado da busca em formato inesperado ou sem conteúdo.")
+        if not decisoes and not avisos: # Lista vazia, pode acontecer se o script retornar []
+            st.info("A busca não retornou resultados ou a lista de resultados está vazia.")
 
     st.markdown("---")
     if st.button("Voltar para Registro de Fatos", key="btn_juris_to_fatos"):
@@ -676,6 +1246,7 @@ def render_busca_jurisprudencia_page(app_configs):
         st.session_state.termo_jurisprudencia = ""
         st.session_state.resultados_jurisprudencia = None
         st.session_state.buscando_jurisprudencia = False
+        st.session_state.origem_jurisprudencia = None
         navigate_to("input_fatos")
         st.rerun()
 # ... (seu código existente) ...
@@ -693,45 +1264,208 @@ def render_fatos_input_page(app_configs):
     )
 
     if uploaded_audio_files:
+        ffmpeg_disponivel = audio.ffmpeg_disponivel()
+        comprimir_audio = st.checkbox(
+            "Comprimir antes do envio (Opus 16 kHz mono)",
+            value=AUDIO_COMPRIMIR_PADRAO and ffmpeg_disponivel,
+            disabled=not ffmpeg_disponivel,
+            help="Reduz o upload de WAV/M4A e evita estourar o limite de tamanho." if ffmpeg_disponivel
+            else "Requer o ffmpeg instalado no servidor.",
+            key="fatos_audio_comprimir"
+        )
+        remover_silencios = st.checkbox(
+            "Remover silêncios longos (> 1 s)",
+            value=AUDIO_REMOVER_SILENCIOS_PADRAO,
+            disabled=not comprimir_audio,
+            key="fatos_audio_remover_silencios"
+        )
+        if st.session_state.get("resumo_transcricao_audio"):
+            with st.expander("Resumo da última transcrição"):
+                for linha in st.session_state.resumo_transcricao_audio:
+                    st.markdown(linha)
         if st.button("➕ Adicionar Transcrição(ões) aos Fatos", key="btn_transcribe_fatos"):
             groq_api_key = app_configs.get("groq_api_key")  # Vem de st.secrets via app_configs
             if not groq_api_key:
                 st.error("Chave API da Groq não configurada em `.streamlit/secrets.toml`. Necessária para transcrição.")
             else:
-                all_transcriptions_texts = []
+                total_audios = len(uploaded_audio_files)
+                # Um texto por áudio, na ordem de envio, independentemente da ordem em que terminam
+                all_transcriptions_texts = [None] * total_audios
                 has_errors_in_transcription = False
                 progress_bar = st.progress(0)
                 status_text = st.empty()
-
-                for i, audio_file in enumerate(uploaded_audio_files):
-                    current_progress = (i + 1) / len(uploaded_audio_files)
-                    status_text.info(
-                        f"Processando áudio {i + 1} de {len(uploaded_audio_files)}: '{audio_file.name}'...")
-
-                    file_size_mb = audio_file.size / (1024 * 1024)
-                    if file_size_mb > MAX_AUDIO_FILE_SIZE_MB:
-                        st.warning(
-                            f"Áudio '{audio_file.name}' ({file_size_mb:.2f}MB) excede o limite de {MAX_AUDIO_FILE_SIZE_MB}MB e será ignorado.")
-                        all_transcriptions_texts.append(
-                            f"\n--- [Áudio '{audio_file.name}' ignorado: tamanho excede o limite] ---\n")
-                        has_errors_in_transcription = True
-                        progress_bar.progress(current_progress)
-                        continue
-
-                    audio_bytes = audio_file.getvalue()
-                    # Passa a chave API diretamente para a função de transcrição
-                    transcription = transcribe_with_groq(groq_api_key, audio_bytes, audio_file.name)
-
-                    if transcription:
-                        all_transcriptions_texts.append(
-                            f"\n--- Transcrição de '{audio_file.name}' ---\n{transcription}\n--- Fim da Transcrição de '{audio_file.name}' ---")
+                linhas_status = [st.empty() for _ in uploaded_audio_files]
+                relatorios_compressao = [st.empty() for _ in uploaded_audio_files]
+                # índice -> "comprimindo"/"dividindo"/"transcrevendo"; escrito pelas threads, lido só aqui
+                estados = {}
+                partes_por_audio = {}  # índice -> transcrições das partes (áudios grandes divididos com ffmpeg)
+                erros_por_audio = {}
+                resumo = [None] * total_audios  # Mantido na sessão: as linhas de status somem no st.rerun()
+                tamanhos = {}  # índice -> (bytes originais, bytes enviados, segundos de compressão)
+                envios = collections.defaultdict(lambda: [0, 0.0])  # índice -> [bytes enviados, segundos de requisição]
+
+                cache_transcricoes = get_cache_transcricoes()  # Obtido aqui: as threads não podem chamar st.*
+                sessao = st.session_state.id_sessao
+                esperas_limite = {}  # índice -> espera estimada pelo limite de uso da Groq
+
+                def transcrever(indice, nome, audio_bytes):
+                    estados[indice] = "transcrevendo"
+                    inicio = time.perf_counter()
+
+                    def ao_aguardar(espera_s, na_frente):
+                        if espera_s > 0:
+                            esperas_limite[indice] = espera_s
+                        else:
+                            esperas_limite.pop(indice, None)
+                    transcription, error_msg = transcrever_audio_groq(groq_api_key, audio_bytes, nome,
+                                                                      cache=cache_transcricoes, sessao=sessao,
+                                                                      ao_aguardar=ao_aguardar)
+                    return transcription, error_msg, time.perf_counter() - inicio
+
+                def comprimir(indice, nome, audio_bytes):
+                    estados[indice] = "comprimindo"
+                    inicio = time.perf_counter()
+                    nome_final, bytes_finais = audio.comprimir_para_opus(audio_bytes, nome, remover_silencios)
+                    return nome_final, bytes_finais, time.perf_counter() - inicio
+
+                def dividir(indice, nome, audio_bytes):
+                    estados[indice] = "dividindo"
+                    return audio.dividir_audio(audio_bytes, nome)
+
+                def agendar(i, nome, audio_bytes):
+                    """Transcreve direto ou, se ainda estiver acima do limite, divide em partes antes."""
+                    if len(audio_bytes) / (1024 * 1024) <= MAX_AUDIO_FILE_SIZE_MB:
+                        linhas_status[i].caption(f"⏳ '{uploaded_audio_files[i].name}': na fila")
+                        return executor.submit(transcrever, i, nome, audio_bytes), (i, 0)
+                    # Áudios grandes são divididos em partes transcritas em paralelo e depois emendadas
+                    linhas_status[i].caption(f"⏳ '{uploaded_audio_files[i].name}': na fila para divisão")
+                    return executor.submit(dividir, i, nome, audio_bytes), (i, "dividir")
+
+                def finalizar_audio(i, texto, erro, duracao, do_cache=False):
+                    nonlocal has_errors_in_transcription
+                    nome = uploaded_audio_files[i].name
+                    if texto:
+                        all_transcriptions_texts[i] = (
+                            f"\n--- Transcrição de '{nome}' ---\n{texto}\n--- Fim da Transcrição de '{nome}' ---")
+                        if do_cache:
+                            resumo[i] = f"⚡ '{nome}': transcrição instantânea (já estava no cache)"
+                        else:
+                            # Guarda pelo áudio original, já que o enviado pode ter sido comprimido ou dividido
+                            cache_transcricoes.gravar(chave_cache_transcricao(uploaded_audio_files[i].getvalue()), texto)
+                            resumo[i] = f"✅ '{nome}': transcrito em {duracao:.1f}s"
+                        linhas_status[i].caption(resumo[i])
                     else:
-                        all_transcriptions_texts.append(f"\n--- [Falha na transcrição de '{audio_file.name}'] ---")
+                        # A falha de um áudio não interrompe os demais
+                        all_transcriptions_texts[i] = f"\n--- [Falha na transcrição de '{nome}'] ---"
+                        resumo[i] = f"❌ {erro or f'Transcrição ({nome}) - resposta vazia.'}"
+                        linhas_status[i].error(resumo[i])
                         has_errors_in_transcription = True
-                    progress_bar.progress(current_progress)
+                    if i in tamanhos and tamanhos[i][0] > tamanhos[i][1]:
+                        original, enviado, tempo_compressao = tamanhos[i]
+                        bytes_enviados, tempo_envio = envios[i]
+                        # Estimativa: o tempo por byte observado nas requisições deste áudio, aplicado aos bytes poupados
+                        economia_s = tempo_envio / bytes_enviados * (original - enviado) if bytes_enviados else 0.0
+                        relatorio = (
+                            f"🗜️ '{nome}': {original / 1024 / 1024:.1f}MB → {enviado / 1024 / 1024:.1f}MB "
+                            f"(-{100 * (1 - enviado / original):.0f}%), ≈ {economia_s:.1f}s de upload poupados "
+                            f"(compressão levou {tempo_compressao:.1f}s)")
+                        relatorios_compressao[i].caption(relatorio)
+                        resumo[i] += "  \n" + relatorio
+
+                futuros = {}  # futuro -> (índice do áudio, "comprimir"/"dividir" ou número da parte)
+                with ThreadPoolExecutor(max_workers=TRANSCRICAO_CONCORRENCIA) as executor:
+                    inicio_lote = time.perf_counter()
+                    for i, audio_file in enumerate(uploaded_audio_files):
+                        file_size_mb = audio_file.size / (1024 * 1024)
+                        # Mesmo áudio já transcrito (nesta ou em outra sessão): nem comprime, nem envia
+                        entrada_cache = cache_transcricoes.obter(chave_cache_transcricao(audio_file.getvalue()))
+                        if entrada_cache is not None:
+                            finalizar_audio(i, entrada_cache.valor, None, 0.0, do_cache=True)
+                            continue
+                        if comprimir_audio:
+                            linhas_status[i].caption(f"⏳ '{audio_file.name}': na fila para compressão")
+                            futuros[executor.submit(comprimir, i, audio_file.name, audio_file.getvalue())] = (i, "comprimir")
+                        elif file_size_mb > MAX_AUDIO_FILE_SIZE_MB and not ffmpeg_disponivel:
+                            linhas_status[i].warning(
+                                f"Áudio '{audio_file.name}' ({file_size_mb:.2f}MB) excede o limite de {MAX_AUDIO_FILE_SIZE_MB}MB e será ignorado (ffmpeg não encontrado para dividi-lo).")
+                            all_transcriptions_texts[i] = f"\n--- [Áudio '{audio_file.name}' ignorado: tamanho excede o limite] ---\n"
+                            has_errors_in_transcription = True
+                        else:
+                            futuro, etapa = agendar(i, audio_file.name, audio_file.getvalue())
+                            futuros[futuro] = etapa
+
+                    pendentes = set(futuros)
+                    while pendentes:
+                        concluidos, pendentes = wait(pendentes, timeout=0.5, return_when=FIRST_COMPLETED)
+                        for futuro in concluidos:
+                            i, etapa = futuros[futuro]
+                            nome = uploaded_audio_files[i].name
+                            if etapa == "comprimir":
+                                try:
+                                    nome_final, bytes_finais, tempo_compressao = futuro.result()
+                                except Exception as e:
+                                    finalizar_audio(i, None, f"Compressão do áudio '{nome}' falhou: {e}", 0.0)
+                                    continue
+                                tamanhos[i] = (uploaded_audio_files[i].size, len(bytes_finais), tempo_compressao)
+                                novo, novo_etapa = agendar(i, nome_final, bytes_finais)
+                                futuros[novo] = novo_etapa
+                                pendentes.add(novo)
+                                continue
+                            if etapa == "dividir":
+                                try:
+                                    segmentos = futuro.result()
+                                except Exception as e:
+                                    finalizar_audio(i, None, f"Divisão do áudio '{nome}' falhou: {e}", 0.0)
+                                    continue
+                                partes_por_audio[i] = [None] * len(segmentos)
+                                for numero, (nome_segmento, bytes_segmento) in enumerate(segmentos):
+                                    novo = executor.submit(transcrever, i, nome_segmento, bytes_segmento)
+                                    futuros[novo] = (i, numero)
+                                    envios[i][0] += len(bytes_segmento)
+                                    pendentes.add(novo)
+                                continue
+                            try:
+                                transcription, error_msg, duracao = futuro.result()
+                            except Exception as e:
+                                transcription, error_msg, duracao = None, f"Transcrição ({nome}) - Erro inesperado: {e}", 0.0
+                            envios[i][1] += duracao
+                            if i not in partes_por_audio:
+                                envios[i][0] += tamanhos[i][1] if i in tamanhos else uploaded_audio_files[i].size
+                                finalizar_audio(i, transcription, error_msg, duracao)
+                                continue
+                            partes = partes_por_audio[i]
+                            partes[etapa] = transcription or ""
+                            if not transcription:
+                                erros_por_audio.setdefault(i, error_msg)
+                            if all(texto is not None for texto in partes):
+                                if i in erros_por_audio:
+                                    finalizar_audio(i, None, erros_por_audio[i], 0.0)
+                                else:
+                                    finalizar_audio(i, audio.unir_transcricoes(partes), None,
+                                                    time.perf_counter() - inicio_lote)
+                        for futuro in pendentes:
+                            i, _ = futuros[futuro]
+                            nome = uploaded_audio_files[i].name
+                            if esperas_limite.get(i):
+                                linhas_status[i].caption(
+                                    f"⏳ '{nome}': limite de uso da Groq atingido, aguardando a vez (~{esperas_limite[i]:.0f}s)...")
+                            elif i in partes_por_audio:
+                                prontas = sum(texto is not None for texto in partes_por_audio[i])
+                                linhas_status[i].caption(
+                                    f"🎙️ '{nome}': transcrevendo em partes ({prontas} de {len(partes_por_audio[i])} pronta(s))...")
+                            elif estados.get(i) == "comprimindo":
+                                linhas_status[i].caption(f"🗜️ '{nome}': comprimindo...")
+                            elif estados.get(i) == "dividindo":
+                                linhas_status[i].caption(f"✂️ '{nome}': dividindo nos silêncios...")
+                            elif estados.get(i) == "transcrevendo":
+                                linhas_status[i].caption(f"🎙️ '{nome}': transcrevendo...")
+                        finalizados = sum(texto is not None for texto in all_transcriptions_texts)
+                        progress_bar.progress(finalizados / total_audios)
+                        status_text.info(f"Transcrevendo áudios: {finalizados} de {total_audios} concluído(s)...")
 
                 status_text.empty()
                 progress_bar.empty()
+                st.session_state.resumo_transcricao_audio = [linha for linha in resumo if linha]
 
                 if all_transcriptions_texts:
                     current_buffer = st.session_state.fatos_text_buffer
@@ -757,17 +1491,48 @@ def render_fatos_input_page(app_configs):
     )
 
     if uploaded_text_files:
+        estatisticas_extracao = get_cache_extracao().estatisticas()
+        if estatisticas_extracao["acertos"] + estatisticas_extracao["falhas"]:
+            st.caption(
+                f"⚡ Cache de documentos: {estatisticas_extracao['taxa_acerto']:.0%} de acertos "
+                f"({estatisticas_extracao['acertos']} de {estatisticas_extracao['acertos'] + estatisticas_extracao['falhas']} arquivo(s) "
+                f"desde que o servidor iniciou), {estatisticas_extracao['itens']} texto(s) guardado(s) "
+                f"em {estatisticas_extracao['bytes'] / 1024 / 1024:.1f}MB")
         if st.button("➕ Adicionar Conteúdo do(s) Arquivo(s) aos Fatos", key="btn_add_text_files"):
             all_extracted_texts = []
             has_errors_in_extraction = False
             text_file_progress_bar = st.progress(0)
             text_file_status_text = st.empty()
 
-            for i, text_file in enumerate(uploaded_text_files):
-                current_progress = (i + 1) / len(uploaded_text_files)
-                text_file_status_text.info(
-                    f"Processando arquivo de texto {i + 1} de {len(uploaded_text_files)}: '{text_file.name}'...")
-                extracted_content, error_msg = extract_text_from_file(text_file)
+            # Obtidos aqui: as threads não podem chamar st.*
+            pool_extracao = get_pool_extracao()
+            cache_extracao = get_cache_extracao()
+            total_arquivos = len(uploaded_text_files)
+            paginas = {}  # índice -> (páginas prontas, total de páginas); escrito pelas threads, lido só aqui
+
+            def extrair(indice, text_file):
+                def registrar_progresso(prontas, total):
+                    paginas[indice] = (prontas, total)
+                return extract_text_from_file(text_file, pool=pool_extracao, ao_progredir=registrar_progresso,
+                                              cache=cache_extracao)
+
+            with ThreadPoolExecutor(max_workers=EXTRACAO_ARQUIVOS_SIMULTANEOS) as executor:
+                futuros = [executor.submit(extrair, i, text_file) for i, text_file in enumerate(uploaded_text_files)]
+                pendentes = set(futuros)
+                while pendentes:
+                    _, pendentes = wait(pendentes, timeout=0.3, return_when=FIRST_COMPLETED)
+                    prontas = sum(feitas for feitas, _ in paginas.values())
+                    total_paginas = sum(total for _, total in paginas.values())
+                    concluidos = total_arquivos - len(pendentes)
+                    text_file_progress_bar.progress(
+                        prontas / total_paginas if total_paginas and pendentes else concluidos / total_arquivos)
+                    text_file_status_text.info(
+                        f"Processando arquivos de texto: {concluidos} de {total_arquivos} concluído(s)"
+                        + (f", {prontas} de {total_paginas} página(s) de PDF extraída(s)..." if total_paginas else "..."))
+
+            # Os textos são montados na ordem de envio, não na ordem em que terminaram
+            for text_file, futuro in zip(uploaded_text_files, futuros):
+                extracted_content, error_msg = futuro.result()
                 if error_msg:
                     st.warning(f"Arquivo '{text_file.name}': {error_msg}")
                     all_extracted_texts.append(f"\n--- [Falha ao ler o arquivo '{text_file.name}': {error_msg}] ---")
@@ -778,7 +1543,6 @@ def render_fatos_input_page(app_configs):
                 else:
                     all_extracted_texts.append(
                         f"\n--- [Arquivo '{text_file.name}' não continha texto extraível ou estava vazio] ---")
-                text_file_progress_bar.progress(current_progress)
 
             text_file_status_text.empty()
             text_file_progress_bar.empty()
@@ -861,67 +1625,215 @@ def render_chat_selection_page(app_configs):
         st.rerun()
 
 
+def _exibir_resposta_em_streaming(gerador):
+    """Mostra a resposta do assistente à medida que é gerada e devolve o texto completo ("" se nada chegou)."""
+    with st.chat_message("assistant"):
+        texto = st.write_stream(gerador)
+    return texto if isinstance(texto, str) else "".join(str(parte) for parte in texto)
+
+
+def _avisar_espera_groq(aviso):
+    """Callback 'ao_aguardar' para chamadas feitas na thread do script: mostra a espera em 'aviso' (st.empty)."""
+    def ao_aguardar(espera_s, na_frente):
+        if espera_s > 0:
+            aviso.info(mensagem_espera_groq(espera_s, na_frente))
+        else:
+            aviso.empty()
+    return ao_aguardar
+
+
+def _resposta_com_cache(cache, chave, gerador, metadados, campos_metadados=(), ler_cache=True):
+    """
+    Envolve o gerador de uma resposta em streaming: se 'chave' estiver no cache, entrega o
+    texto guardado (e os 'campos_metadados') sem chamar a API; senão repassa os pedaços e,
+    ao final sem erro, grava a resposta completa. 'metadados["do_cache"]' recebe a data da
+    resposta reaproveitada. Com ler_cache=False ("Regenerar") a resposta é sempre nova.
+    """
+    entrada = cache.obter(chave) if cache is not None and ler_cache else None
+    if entrada is not None:
+        metadados.update(entrada.valor["metadados"])
+        metadados["do_cache"] = entrada.criado_em
+        yield entrada.valor["texto"]
+        return
+    partes = []
+    for parte in gerador:
+        partes.append(parte)
+        yield parte
+    if cache is not None and partes and not metadados.get("erro"):
+        cache.gravar(chave, {"texto": "".join(partes),
+                             "metadados": {campo: metadados[campo] for campo in campos_metadados if campo in metadados}})
+
+
+def _regenerar_ultima_resposta(chat_type):
+    """Descarta a última resposta para que seja gerada de novo, sem passar pelo cache de respostas."""
+    mensagens = st.session_state[f"{chat_type}_messages"]
+    mensagens.pop()  # Resposta
+    pergunta = mensagens.pop()
+    if mensagens:
+        st.session_state.pergunta_a_regenerar = pergunta["content"]
+    else:
+        # Resposta aos fatos: o processamento inicial é refeito do zero
+        reset_all_chat_states()
+        st.session_state.selected_chat_type = chat_type
+        st.session_state.regenerar_resposta_inicial = True
+
+
+def _analisar_partes_groq(app_configs, prompts, rotulo, cache=None):
+    """
+    Envia cada prompt ao Groq em paralelo e mostra o progresso. Retorna os textos na ordem
+    dos prompts; partes que falharem viram um aviso no lugar da análise.
+    """
+    api_key = app_configs["groq_api_key"]
+    model_id = app_configs["selected_groq_model"]
+    sessao = st.session_state.id_sessao
+    resultados = [None] * len(prompts)
+    esperas = {}  # parte -> (espera estimada, chamadas na frente); escrito pelas threads, lido só aqui
+    progresso = st.progress(0.0, text=f"{rotulo}: 0/{len(prompts)}")
+    aviso_espera = st.empty()
+
+    def consultar(i, prompt):
+        def ao_aguardar(espera_s, na_frente):
+            if espera_s > 0:
+                esperas[i] = (espera_s, na_frente)
+            else:
+                esperas.pop(i, None)
+        return consultar_groq(api_key, model_id, [{"role": "user", "content": prompt}], cache,
+                              PRIORIDADE_LOTE, sessao, ao_aguardar)
+
+    with ThreadPoolExecutor(max_workers=FATOS_PARTES_CONCORRENCIA) as executor:
+        futuros = {executor.submit(consultar, i, prompt): i for i, prompt in enumerate(prompts)}
+        pendentes = set(futuros)
+        prontos = 0
+        while pendentes:
+            concluidos, pendentes = wait(pendentes, timeout=0.5, return_when=FIRST_COMPLETED)
+            for futuro in concluidos:
+                i = futuros[futuro]
+                texto, erro = futuro.result()
+                if texto:
+                    resultados[i] = texto
+                else:
+                    st.warning(f"Parte {i + 1}: {erro or 'resposta vazia.'}")
+                    resultados[i] = f"[Parte {i + 1} não analisada]"
+                prontos += 1
+            progresso.progress(prontos / len(prompts), text=f"{rotulo}: {prontos}/{len(prompts)}")
+            esperas_atuais = list(esperas.values())
+            if esperas_atuais:
+                aviso_espera.info(mensagem_espera_groq(*max(esperas_atuais)))
+            else:
+                aviso_espera.empty()
+    progresso.empty()
+    aviso_espera.empty()
+    return resultados
+
+
+def _mensagens_analise_em_partes(app_configs, fatos, orcamento, cache=None):
+    """
+    Fatos maiores que o orçamento do modelo: divide nos limites dos anexos, analisa as partes
+    em paralelo (mapa) e devolve a mensagem que consolida as análises (redução), a ser
+    enviada em streaming. Se as análises juntas ainda excederem o orçamento, são
+    consolidadas em grupos antes. Retorna (mensagens, numero_de_partes).
+    """
+    partes = dividir_fatos(fatos, orcamento - TOKENS_INSTRUCOES_PARTE)
+    analises = _analisar_partes_groq(
+        app_configs, [prompt_mapa(parte, numero, len(partes)) for numero, parte in enumerate(partes, 1)],
+        "Analisando as partes dos fatos", cache)
+    while len(analises) > 1 and estimar_tokens(prompt_reducao(analises)) > orcamento:
+        grupos = dividir_fatos("\n\n".join(analises), orcamento - TOKENS_INSTRUCOES_PARTE)
+        if len(grupos) >= len(analises):
+            break  # Cada análise já ocupa uma parte inteira: não há como reduzir mais
+        analises = _analisar_partes_groq(app_configs, [prompt_reducao([grupo]) for grupo in grupos],
+                                         "Consolidando as análises", cache)
+    return [{"role": "user", "content": prompt_reducao(analises)}], len(partes)
+
+
 def _handle_initial_prompt_processing(app_configs):
     chat_type = st.session_state.selected_chat_type
     chat_title_map = {"chatvolt": "Assistente Jurídico Principal", "groq": "Assistente Geral Rápido"}
     chat_title = chat_title_map.get(chat_type, "Assistente")
 
-    with st.spinner(f"Analisando os fatos com {chat_title}..."):
-        if chat_type == "chatvolt":
-            # Adiciona a mensagem do usuário (fatos) antes de fazer a query
-            st.session_state.chatvolt_messages.append({"role": "user", "content": st.session_state.fatos_text})
-            response_data = query_chatvolt_agent(
-                app_configs["chatvolt_api_key"], app_configs["chatvolt_agent_id"], st.session_state.fatos_text,
-                st.session_state.chatvolt_conversation_id, st.session_state.chatvolt_visitor_id
-            )
-            assistant_response_text = "Desculpe, não consegui processar os fatos iniciais (Chatvolt)."
-            docx_bytes = None
-            msg_id = "cv_initial_error"
-            sources = []
+    with st.chat_message("user"):
+        st.markdown(st.session_state.fatos_text)
 
-            if response_data:
-                assistant_response_text = response_data.get("answer", "Não obtive uma resposta clara.")
-                st.session_state.chatvolt_conversation_id = response_data.get("conversationId")
-                st.session_state.chatvolt_visitor_id = response_data.get("visitorId")
-                sources = response_data.get("sources", [])
-                msg_id = response_data.get("messageId", "cv_initial_ok")
+    # "Regenerar" grava a nova resposta no cache, mas não lê a anterior
+    cache = app_configs["cache_respostas"]
+    ler_cache = not st.session_state.regenerar_resposta_inicial
+    st.session_state.regenerar_resposta_inicial = False
 
-            docx_bytes = create_docx_from_text_or_html(assistant_response_text, is_html=True,
-                                                       title=f"Resposta Inicial - {chat_title}")
-            st.session_state.chatvolt_messages.append({
-                "role": "assistant", "content": assistant_response_text,
-                "sources": sources, "id": msg_id, "docx_bytes": docx_bytes
-            })
-
-        elif chat_type == "groq":
-            # Adiciona a mensagem do usuário (fatos) antes de fazer a query
-            st.session_state.groq_messages.append({"role": "user", "content": st.session_state.fatos_text})
-            # Para Groq, o histórico completo de mensagens é normalmente enviado
-            groq_history_for_api = [{"role": msg["role"], "content": msg["content"]} for msg in
-                                    st.session_state.groq_messages]
-            response_data = query_groq_api(
-                app_configs["groq_api_key"], app_configs["selected_groq_model"], groq_history_for_api
-            )
-            assistant_response_text = "Desculpe, não consegui processar os fatos iniciais (Groq)."
-            docx_bytes = None
-            msg_id = "groq_initial_error"
+    # A resposta aparece token a token; o histórico só recebe o texto completo
+    if chat_type == "chatvolt":
+        # Adiciona a mensagem do usuário (fatos) antes de fazer a query
+        st.session_state.chatvolt_messages.append({"role": "user", "content": st.session_state.fatos_text})
+        metadados = {}
+        # IDs da conversa não vão para o cache: a conversa no Chatvolt é de quem a criou
+        chave = chave_cache_resposta("chatvolt", app_configs["chatvolt_agent_id"], None,
+                                     [{"role": "user", "content": st.session_state.fatos_text}])
+        assistant_response_text = _exibir_resposta_em_streaming(_resposta_com_cache(cache, chave, stream_chatvolt_agent(
+            app_configs["chatvolt_api_key"], app_configs["chatvolt_agent_id"], st.session_state.fatos_text,
+            metadados, st.session_state.chatvolt_conversation_id, st.session_state.chatvolt_visitor_id
+        ), metadados, ("sources", "messageId", "answer"), ler_cache))
+        docx_bytes = None
+        msg_id = "cv_initial_error"
+        sources = []
+
+        if metadados.get("erro"):
+            st.error(metadados["erro"])
+        if assistant_response_text or metadados.get("answer"):
+            assistant_response_text = assistant_response_text or metadados["answer"]
+            st.session_state.chatvolt_conversation_id = metadados.get("conversationId")
+            st.session_state.chatvolt_visitor_id = metadados.get("visitorId")
+            sources = metadados.get("sources", [])
+            msg_id = metadados.get("messageId", "cv_initial_ok")
+        else:
+            assistant_response_text = "Desculpe, não consegui processar os fatos iniciais (Chatvolt)."
 
-            if response_data and response_data.get("choices"):
-                assistant_response_text = response_data["choices"][0]["message"]["content"]
-                msg_id = response_data.get("id", "groq_initial_ok")
-            elif response_data and "error" in response_data:  # Trata erros da API Groq
-                assistant_response_text += f" Detalhe: {response_data['error'].get('message', '')}"
+        docx_bytes = create_docx_from_text_or_html(assistant_response_text, is_html=True,
+                                                   title=f"Resposta Inicial - {chat_title}")
+        st.session_state.chatvolt_messages.append({
+            "role": "assistant", "content": assistant_response_text,
+            "sources": sources, "id": msg_id, "docx_bytes": docx_bytes, "do_cache": metadados.get("do_cache")
+        })
 
-            docx_bytes = create_docx_from_text_or_html(assistant_response_text, is_html=False,
-                                                       # Groq geralmente não retorna HTML
-                                                       title=f"Resposta Inicial - {chat_title}")
-            st.session_state.groq_messages.append({
-                "role": "assistant", "content": assistant_response_text,
-                "id": msg_id, "docx_bytes": docx_bytes
-            })
-
-        st.session_state.initial_prompt_processed = True
-        st.rerun()
+    elif chat_type == "groq":
+        # Adiciona a mensagem do usuário (fatos) antes de fazer a query
+        st.session_state.groq_messages.append({"role": "user", "content": st.session_state.fatos_text})
+        # Para Groq, o histórico completo de mensagens é normalmente enviado
+        groq_history_for_api = [{"role": msg["role"], "content": msg["content"]} for msg in
+                                st.session_state.groq_messages]
+        orcamento = orcamento_historico(app_configs["selected_groq_model"])
+        partes_analisadas = None
+        if app_configs["groq_api_key"] and estimar_tokens(st.session_state.fatos_text) > orcamento:
+            groq_history_for_api, partes_analisadas = _mensagens_analise_em_partes(
+                app_configs, st.session_state.fatos_text, orcamento, cache if ler_cache else None)
+        metadados = {}
+        chave = chave_cache_resposta("groq", app_configs["selected_groq_model"], GROQ_TEMPERATURA, groq_history_for_api)
+        aviso_espera = st.empty()
+        assistant_response_text = _exibir_resposta_em_streaming(_resposta_com_cache(cache, chave, stream_groq_api(
+            app_configs["groq_api_key"], app_configs["selected_groq_model"], groq_history_for_api, metadados,
+            st.session_state.id_sessao, _avisar_espera_groq(aviso_espera)
+        ), metadados, ("id",), ler_cache))
+        docx_bytes = None
+        msg_id = "groq_initial_error"
+
+        if metadados.get("erro"):
+            st.error(metadados["erro"])
+        if assistant_response_text:
+            msg_id = metadados.get("id", "groq_initial_ok")
+        else:
+            assistant_response_text = "Desculpe, não consegui processar os fatos iniciais (Groq)."
+            if metadados.get("erro"):
+                assistant_response_text += f" Detalhe: {metadados['erro']}"
+
+        docx_bytes = create_docx_from_text_or_html(assistant_response_text, is_html=False,
+                                                   # Groq geralmente não retorna HTML
+                                                   title=f"Resposta Inicial - {chat_title}")
+        st.session_state.groq_messages.append({
+            "role": "assistant", "content": assistant_response_text,
+            "id": msg_id, "docx_bytes": docx_bytes, "partes_analisadas": partes_analisadas,
+            "do_cache": metadados.get("do_cache")
+        })
+
+    st.session_state.initial_prompt_processed = True
+    st.rerun()
 
 
 def _display_chat_messages():
@@ -947,6 +1859,25 @@ def _display_chat_messages():
                                 st.link_button(f"Acessar Documento {s_idx + 1}", source['document_url'])
                             st.divider()
 
+                if message.get("do_cache"):
+                    st.caption("♻️ Resposta reaproveitada do cache (gerada em "
+                               f"{time.strftime('%d/%m/%Y %H:%M', time.localtime(message['do_cache']))}).")
+                if message.get("partes_analisadas"):
+                    st.caption(f"🧩 Fatos extensos: analisados em {message['partes_analisadas']} partes "
+                               "em paralelo e consolidados nesta resposta.")
+                economia = message.get("economia_tokens")
+                if economia and economia["tokens_economizados"]:
+                    detalhes = []
+                    if economia.get("passagens_recuperadas"):
+                        detalhes.append(f"{economia['passagens_recuperadas']} trechos relevantes dos fatos")
+                    if economia["mensagens_resumidas"]:
+                        detalhes.append(f"{economia['mensagens_resumidas']} mensagens antigas resumidas")
+                    elif economia["mensagens_descartadas"]:
+                        detalhes.append(f"{economia['mensagens_descartadas']} mensagens antigas omitidas")
+                    st.caption(f"📉 ~{economia['tokens_enviados']:,} tokens enviados de "
+                               f"~{economia['tokens_historico']:,} no histórico "
+                               f"({economia['tokens_economizados']:,} economizados; {'; '.join(detalhes)}).".replace(",", "."))
+
                 if message.get("docx_bytes"):
                     file_name = f"resposta_{chat_type}_{message.get('id', f'msg{i}')}.docx"
                     st.download_button(
@@ -956,10 +1887,64 @@ def _display_chat_messages():
                         mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
                         key=f"download_btn_{chat_type}_{message.get('id', i)}"
                     )
+                if i == len(current_messages) - 1:
+                    st.button("🔄 Regenerar", key=f"regenerar_{chat_type}_{i}", on_click=_regenerar_ultima_resposta,
+                              args=(chat_type,), help="Gera outra resposta, sem reaproveitar a do cache.")
+
+
+def _indice_fatos_da_sessao(fatos):
+    """Índice BM25 dos fatos, construído uma vez por sessão e refeito só se os fatos mudarem."""
+    hash_fatos = hashlib.sha256(fatos.encode("utf-8")).hexdigest()
+    if not st.session_state.indice_fatos or st.session_state.indice_fatos["hash"] != hash_fatos:
+        st.session_state.indice_fatos = {"hash": hash_fatos, "indice": IndiceFatos(fatos)}
+    return st.session_state.indice_fatos["indice"]
+
+
+def _janela_historico_groq(app_configs):
+    """
+    Histórico a enviar ao Groq dentro do orçamento de tokens do modelo. Fatos extensos são
+    substituídos pelos trechos mais relevantes para a última pergunta (BM25); as mensagens
+    recentes vão inteiras e as antigas são trocadas por um resumo que fica em cache na
+    sessão e só é refeito quando mais mensagens precisam sair. Retorna (mensagens, relatorio).
+    """
+    api_key = app_configs["groq_api_key"]
+    model_id = app_configs["selected_groq_model"]
+
+    def resumir(resumo_anterior, mensagens):
+        with st.spinner("Resumindo o início da conversa para caber no contexto do modelo..."):
+            texto, erro = consultar_groq(api_key, model_id, [
+                {"role": "user", "content": prompt_resumo(resumo_anterior, mensagens)}], app_configs["cache_respostas"],
+                sessao=st.session_state.id_sessao)
+        if erro:
+            st.warning(f"Não foi possível resumir o início da conversa: {erro}")
+        return texto
+
+    mensagens = [{"role": msg["role"], "content": msg["content"]} for msg in st.session_state.groq_messages]
+    tokens_fatos_omitidos = 0
+    passagens = []
+    fatos = mensagens[0]["content"] if mensagens and mensagens[0]["role"] == "user" else ""
+    if len(mensagens) > 1 and estimar_tokens(fatos) > FATOS_TOKENS_RECUPERACAO:
+        indice = _indice_fatos_da_sessao(fatos)
+        passagens = [passagem for passagem, _ in indice.buscar(mensagens[-1]["content"], RECUPERACAO_TOP_K)]
+        passagens = passagens or indice.passagens[:RECUPERACAO_TOP_K]  # Pergunta sem termos em comum com os fatos
+        mensagens[0] = {"role": "user", "content": mensagem_com_passagens(passagens)}
+        tokens_fatos_omitidos = max(0, estimar_tokens(fatos) - estimar_tokens(mensagens[0]["content"]))
+
+    janela, st.session_state.groq_resumo_historico, relatorio = montar_janela(
+        mensagens, orcamento_historico(model_id), st.session_state.groq_resumo_historico, resumir)
+    relatorio["tokens_historico"] += tokens_fatos_omitidos
+    relatorio["tokens_economizados"] += tokens_fatos_omitidos
+    relatorio["passagens_recuperadas"] = len(passagens)
+    return janela, relatorio
 
 
 def _handle_subsequent_user_input(app_configs, chat_title):
-    if prompt := st.chat_input(f"Faça uma pergunta sobre os fatos para {chat_title}..."):
+    prompt = st.chat_input(f"Faça uma pergunta sobre os fatos para {chat_title}...")
+    ler_cache = True
+    if not prompt and st.session_state.pergunta_a_regenerar:
+        prompt, ler_cache = st.session_state.pergunta_a_regenerar, False
+        st.session_state.pergunta_a_regenerar = None
+    if prompt:
         chat_type = st.session_state.selected_chat_type
         user_message_data = {"role": "user", "content": prompt}
 
@@ -975,52 +1960,65 @@ def _handle_subsequent_user_input(app_configs, chat_title):
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        with st.spinner(f"{chat_title.split('(')[0].strip()} pensando..."):
-            assistant_response_text = "Desculpe, não consegui processar sua solicitação."
-            docx_bytes = None
-            msg_id_suffix = len(current_message_list) if current_message_list is not None else "unk"
-            msg_id = f"{chat_type}_subsequent_error_{msg_id_suffix}"
-
-            if chat_type == "chatvolt":
-                response_data = query_chatvolt_agent(
-                    app_configs["chatvolt_api_key"], app_configs["chatvolt_agent_id"], prompt,
-                    st.session_state.chatvolt_conversation_id, st.session_state.chatvolt_visitor_id
-                )
-                sources = []
-                if response_data:
-                    assistant_response_text = response_data.get("answer", "Não obtive uma resposta clara.")
-                    st.session_state.chatvolt_conversation_id = response_data.get(
-                        "conversationId")  # Atualiza ID da conversa
-                    st.session_state.chatvolt_visitor_id = response_data.get("visitorId")  # Atualiza ID do visitante
-                    sources = response_data.get("sources", [])
-                    msg_id = response_data.get("messageId", f"cv_msg_{msg_id_suffix}")
-
-                docx_bytes = create_docx_from_text_or_html(assistant_response_text, is_html=True,
-                                                           title=f"Resposta - {chat_title}")
-                st.session_state.chatvolt_messages.append({
-                    "role": "assistant", "content": assistant_response_text,
-                    "sources": sources, "id": msg_id, "docx_bytes": docx_bytes
-                })
-
-            elif chat_type == "groq":
-                # Para Groq, o histórico completo de mensagens é normalmente enviado
-                groq_history_for_api = [{"role": msg["role"], "content": msg["content"]} for msg in
-                                        st.session_state.groq_messages]
-                response_data = query_groq_api(app_configs["groq_api_key"], app_configs["selected_groq_model"],
-                                               groq_history_for_api)
-
-                if response_data and response_data.get("choices"):
-                    assistant_response_text = response_data["choices"][0]["message"]["content"]
-                    msg_id = response_data.get("id", f"groq_msg_{msg_id_suffix}")
-                elif response_data and "error" in response_data:  # Trata erros da API Groq
-                    assistant_response_text += f" Detalhe: {response_data['error'].get('message', '')}"
-
-                docx_bytes = create_docx_from_text_or_html(assistant_response_text, is_html=False,
-                                                           title=f"Resposta - {chat_title}")
-                st.session_state.groq_messages.append({
-                    "role": "assistant", "content": assistant_response_text,
-                    "id": msg_id, "docx_bytes": docx_bytes
-                })
+        # A resposta aparece token a token; o histórico só recebe o texto completo
+        assistant_response_text = "Desculpe, não consegui processar sua solicitação."
+        docx_bytes = None
+        msg_id_suffix = len(current_message_list) if current_message_list is not None else "unk"
+        msg_id = f"{chat_type}_subsequent_error_{msg_id_suffix}"
+        metadados = {}
+
+        if chat_type == "chatvolt":
+            query = prompt
+            if not st.session_state.chatvolt_conversation_id:
+                # Resposta inicial veio do cache (ou falhou): a conversa no Chatvolt ainda não conhece os fatos
+                query = f"Fatos do caso:\n{st.session_state.fatos_text}\n\nPergunta: {prompt}"
+            texto_recebido = _exibir_resposta_em_streaming(stream_chatvolt_agent(
+                app_configs["chatvolt_api_key"], app_configs["chatvolt_agent_id"], query, metadados,
+                st.session_state.chatvolt_conversation_id, st.session_state.chatvolt_visitor_id
+            ))
+            if metadados.get("erro"):
+                st.error(metadados["erro"])
+            sources = []
+            if texto_recebido or metadados.get("answer"):
+                assistant_response_text = texto_recebido or metadados["answer"]
+                st.session_state.chatvolt_conversation_id = metadados.get(
+                    "conversationId")  # Atualiza ID da conversa
+                st.session_state.chatvolt_visitor_id = metadados.get("visitorId")  # Atualiza ID do visitante
+                sources = metadados.get("sources", [])
+                msg_id = metadados.get("messageId", f"cv_msg_{msg_id_suffix}")
+
+            docx_bytes = create_docx_from_text_or_html(assistant_response_text, is_html=True,
+                                                       title=f"Resposta - {chat_title}")
+            st.session_state.chatvolt_messages.append({
+                "role": "assistant", "content": assistant_response_text,
+                "sources": sources, "id": msg_id, "docx_bytes": docx_bytes
+            })
+
+        elif chat_type == "groq":
+            groq_history_for_api, economia_tokens = _janela_historico_groq(app_configs)
+            chave = chave_cache_resposta("groq", app_configs["selected_groq_model"], GROQ_TEMPERATURA,
+                                         groq_history_for_api)
+            aviso_espera = st.empty()
+            texto_recebido = _exibir_resposta_em_streaming(_resposta_com_cache(
+                app_configs["cache_respostas"], chave, stream_groq_api(
+                    app_configs["groq_api_key"], app_configs["selected_groq_model"], groq_history_for_api, metadados,
+                    st.session_state.id_sessao, _avisar_espera_groq(aviso_espera)
+                ), metadados, ("id",), ler_cache))
+            if metadados.get("erro"):
+                st.error(metadados["erro"])
+            if texto_recebido:
+                assistant_response_text = texto_recebido
+                msg_id = metadados.get("id", f"groq_msg_{msg_id_suffix}")
+            elif metadados.get("erro"):
+                assistant_response_text += f" Detalhe: {metadados['erro']}"
+
+            docx_bytes = create_docx_from_text_or_html(assistant_response_text, is_html=False,
+                                                       title=f"Resposta - {chat_title}")
+            st.session_state.groq_messages.append({
+                "role": "assistant", "content": assistant_response_text,
+                "id": msg_id, "docx_bytes": docx_bytes, "economia_tokens": economia_tokens,
+                "do_cache": metadados.get("do_cache")
+            })
         st.rerun()
 
 
@@ -2,16 +2,64 @@
 import sys
 import json
 import time
+import argparse
+import threading
+import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service as ChromeService
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
 from webdriver_manager.chrome import ChromeDriverManager
+from decisoes import Decisao, decisoes_dos_resultados, exportar_parquet, resultados_para_dicts
 
-def buscar_jurisprudencia_tjgo(termo_pesquisa, max_resultados=3):
+URL_CONSULTA_JURISPRUDENCIA = "https://projudi.tjgo.jus.br/ConsultaJurisprudencia"
+BACKENDS = ("auto", "http", "selenium")
+HTTP_TIMEOUT_S = 20
+HTTP_POOL_MAXSIZE = 8
+HTTP_PAGINAS_SIMULTANEAS = 4  # Páginas de resultado buscadas em paralelo pelo backend HTTP
+CAMPO_PAGINA_ATUAL = "PaginaAtual"  # Campo oculto do formulário que controla a paginação
+HTTP_PAUSA_APOS_FALHA_S = 600  # Após detectar o backend HTTP quebrado, usa só o Selenium por este período
+HTTP_USER_AGENT = ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+                   "(KHTML, like Gecko) Chrome/124.0 Safari/537.36")
+
+# Recursos que não influenciam o texto dos resultados e são bloqueados no modo rápido
+PADROES_RECURSOS_BLOQUEADOS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.svg", "*.webp", "*.ico",
+    "*.css", "*.woff", "*.woff2", "*.ttf", "*.otf",
+]
+
+# Extrai o texto e o link de todos os blocos de resultado em uma única ida ao navegador
+SCRIPT_TEXTOS_RESULTADOS = """
+return Array.from(document.getElementsByClassName('search-result'))
+    .slice(0, arguments[0])
+    .map(function (bloco) {
+        var link = bloco.querySelector('a[href]');
+        return {texto: bloco.innerText, link: link ? link.href : null};
+    });
+"""
+
+# Incrementa o campo de paginação do formulário e o submete
+SCRIPT_PROXIMA_PAGINA = """
+var campo = document.getElementsByName(arguments[0])[0];
+if (!campo || !campo.form) { return false; }
+campo.value = String((parseInt(campo.value, 10) || 0) + 1);
+campo.form.submit();
+return true;
+"""
+
+
+def criar_navegador(modo_rapido=False):
     """
-    Busca jurisprudência no site do TJGO e retorna os primeiros 'max_resultados'.
+    Inicia o Chrome headless. Lança exceção se o WebDriver não puder ser iniciado.
+    No modo rápido, a página é liberada assim que o DOM fica pronto ('eager') e
+    imagens, CSS e fontes não são baixados.
     """
     options = webdriver.ChromeOptions()
     options.add_argument('--headless')  # Executa o Chrome em modo headless (sem interface gráfica)
@@ -19,24 +67,414 @@ def buscar_jurisprudencia_tjgo(termo_pesquisa, max_resultados=3):
     options.add_argument('--no-sandbox')
     options.add_argument('--disable-dev-shm-usage')
     options.add_argument("window-size=1200x600") # Pode ajudar em alguns casos headless
+    if modo_rapido:
+        options.page_load_strategy = 'eager'
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
 
     # Instala e gerencia o ChromeDriver automaticamente
+    service = ChromeService(ChromeDriverManager().install())
+    navegador = webdriver.Chrome(service=service, options=options)
+    if modo_rapido:
+        try:
+            navegador.execute_cdp_cmd("Network.enable", {})
+            navegador.execute_cdp_cmd("Network.setBlockedURLs", {"urls": PADROES_RECURSOS_BLOQUEADOS})
+        except Exception:
+            pass  # Sem CDP o modo rápido ainda se beneficia do carregamento 'eager'
+    return navegador
+
+
+def navegador_saudavel(navegador):
+    """Verifica se a sessão do WebDriver ainda responde."""
+    try:
+        navegador.current_url
+        return True
+    except Exception:
+        return False
+
+
+def aguardar_contagem_estavel(navegador, seletor_classe, timeout=5, intervalo=0.2):
+    """
+    Aguarda até que a quantidade de elementos com a classe informada pare de mudar
+    entre duas verificações consecutivas (ou até o timeout), em vez de uma pausa fixa.
+    """
+    contagem_anterior = -1
+
+    def contagem_estabilizou(driver):
+        nonlocal contagem_anterior
+        contagem = len(driver.find_elements(By.CLASS_NAME, seletor_classe))
+        estavel = contagem > 0 and contagem == contagem_anterior
+        contagem_anterior = contagem
+        return estavel
+
     try:
-        service = ChromeService(ChromeDriverManager().install())
-        navegador = webdriver.Chrome(service=service, options=options)
+        WebDriverWait(navegador, timeout, poll_frequency=intervalo).until(contagem_estabilizou)
+    except Exception:
+        pass  # Segue com o que já foi carregado
+
+
+class BackendHttpIndisponivel(Exception):
+    """O formulário ou a página de resultados não tem o formato esperado pelo backend HTTP."""
+
+
+class HttpSemResultados(BackendHttpIndisponivel):
+    """
+    A resposta não tem blocos de resultado: pode ser uma busca sem resultados ou uma página
+    que exige JavaScript. Só o Selenium desempata, então não basta para desligar o HTTP.
+    """
+
+
+_sessao_http = None
+_sessao_http_lock = threading.Lock()
+_http_indisponivel_ate = 0.0
+
+
+def obter_sessao_http():
+    """Sessão HTTP compartilhada (keep-alive e pool de conexões) para o backend HTTP."""
+    global _sessao_http
+    with _sessao_http_lock:
+        if _sessao_http is None:
+            sessao = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=2, pool_maxsize=HTTP_POOL_MAXSIZE)
+            sessao.mount("https://", adaptador)
+            sessao.mount("http://", adaptador)
+            sessao.headers["User-Agent"] = HTTP_USER_AGENT
+            _sessao_http = sessao
+        return _sessao_http
+
+
+def _dados_do_formulario(formulario, termo_pesquisa):
+    """Reproduz os campos que o navegador enviaria ao submeter o formulário de consulta."""
+    dados = {}
+    for campo in formulario.find_all(["input", "select", "textarea"]):
+        nome = campo.get("name")
+        if not nome:
+            continue
+        tipo = (campo.get("type") or "").lower()
+        if tipo in ("submit", "button", "image", "reset", "file"):
+            continue
+        if tipo in ("checkbox", "radio") and not campo.has_attr("checked"):
+            continue
+        if campo.name == "select":
+            opcao = campo.find("option", selected=True) or campo.find("option")
+            dados[nome] = opcao.get("value", opcao.get_text()) if opcao else ""
+        elif campo.name == "textarea":
+            dados[nome] = campo.get_text()
+        else:
+            dados[nome] = campo.get("value", "")
+
+    campo_texto = formulario.find(id="Texto")
+    dados[campo_texto.get("name") or "Texto"] = termo_pesquisa
+    botao = formulario.find(id="formLocalizarBotao")
+    if botao is not None and botao.get("name"):
+        dados[botao["name"]] = botao.get("value", "")
+    return dados
+
+
+def _resultados_dos_blocos_html(blocos_de_resultado, primeiro_id, url_base):
+    resultados = []
+    for indice, bloco_individual in enumerate(blocos_de_resultado):
+        texto_do_bloco = bloco_individual.get_text(separator="\n", strip=True)
+        if not texto_do_bloco:
+            texto_do_bloco = "Conteúdo do bloco não pôde ser extraído ou estava vazio."
+        ancora = bloco_individual.find("a", href=True)
+        link = urljoin(url_base, ancora["href"]) if ancora is not None else None
+        resultados.append(Decisao.do_texto(primeiro_id + indice, texto_do_bloco, link))
+    return resultados
+
+
+def _enviar_formulario_http(sessao, url_envio, metodo, dados):
+    """
+    Submete o formulário de consulta e retorna (blocos '.search-result', URL da resposta);
+    os links relativos dos blocos são resolvidos contra essa URL (após redirecionamentos).
+    """
+    if metodo == "get":
+        resposta = sessao.get(url_envio, params=dados, timeout=HTTP_TIMEOUT_S)
+    else:
+        resposta = sessao.post(url_envio, data=dados, timeout=HTTP_TIMEOUT_S)
+    resposta.raise_for_status()
+    return BeautifulSoup(resposta.text, "html.parser").select(".search-result"), resposta.url
+
+
+def iterar_jurisprudencia_http(termo_pesquisa, max_resultados=3, ao_progredir=None):
+    """
+    Busca jurisprudência submetendo o formulário diretamente (sem navegador) e lendo
+    os blocos '.search-result' com BeautifulSoup. Gera uma lista de resultados por página:
+    a primeira página é lida sozinha (para saber quantos resultados cabem em cada uma) e as
+    demais são buscadas em paralelo, em conexões do pool, e entregues à medida que chegam.
+    Lança BackendHttpIndisponivel se a primeira página não tiver o formato esperado
+    (HttpSemResultados se ela só não tiver resultados), para que o chamador use o Selenium.
+    'ao_progredir(mensagem)' é chamado a cada etapa.
+    """
+    ao_progredir = ao_progredir or (lambda mensagem: None)
+    sessao = obter_sessao_http()
+    try:
+        resposta_formulario = sessao.get(URL_CONSULTA_JURISPRUDENCIA, timeout=HTTP_TIMEOUT_S)
+        resposta_formulario.raise_for_status()
+        pagina = BeautifulSoup(resposta_formulario.text, "html.parser")
+        campo_texto = pagina.find(id="Texto")
+        formulario = campo_texto.find_parent("form") if campo_texto is not None else None
+        if formulario is None:
+            raise BackendHttpIndisponivel("Formulário de consulta não encontrado.")
+
+        url_envio = urljoin(resposta_formulario.url, formulario.get("action") or URL_CONSULTA_JURISPRUDENCIA)
+        metodo = (formulario.get("method") or "post").lower()
+        dados = _dados_do_formulario(formulario, termo_pesquisa)
+        blocos_de_resultado, url_resultados = _enviar_formulario_http(sessao, url_envio, metodo, dados)
+    except requests.exceptions.RequestException as e:
+        raise BackendHttpIndisponivel(f"Falha na requisição HTTP: {e}") from e
+
+    if not blocos_de_resultado:
+        # Sem blocos não dá para distinguir "nenhum resultado" de uma página que exige JavaScript
+        raise HttpSemResultados("Nenhum bloco '.search-result' na resposta.")
+
+    primeira_pagina = _resultados_dos_blocos_html(blocos_de_resultado[:max_resultados], 1, url_resultados)
+    yield primeira_pagina
+
+    por_pagina = len(blocos_de_resultado)
+    if max_resultados <= por_pagina:
+        return
+    if CAMPO_PAGINA_ATUAL not in dados:
+        # O pager do Selenium depende do mesmo campo, então não adiantaria trocar de backend. O aviso
+        # também faz a busca ir para o cache, em vez de voltar ao TJGO a cada repetição.
+        yield [{"info": f"O formulário do TJGO não oferece paginação ('{CAMPO_PAGINA_ATUAL}' ausente): "
+                        f"apenas os {len(primeira_pagina)} resultado(s) da primeira página foram obtidos, "
+                        f"de {max_resultados} pedidos."}]
+        return
+    try:
+        pagina_inicial = int(dados[CAMPO_PAGINA_ATUAL] or 0)
+    except ValueError:
+        pagina_inicial = 0
+    total_paginas = math.ceil(max_resultados / por_pagina)
+    ao_progredir(f"Buscando as páginas 2 a {total_paginas} em paralelo...")
+    # Se o servidor ignorar o número da página, as "novas" páginas repetem decisões já entregues
+    textos_vistos = {res.texto for res in primeira_pagina}
+    falhas = []
+
+    executor = ThreadPoolExecutor(max_workers=HTTP_PAGINAS_SIMULTANEAS)
+    try:
+        futuros = {
+            executor.submit(_enviar_formulario_http, sessao, url_envio, metodo,
+                            {**dados, CAMPO_PAGINA_ATUAL: str(pagina_inicial + deslocamento)}): deslocamento
+            for deslocamento in range(1, total_paginas)
+        }
+        for futuro in as_completed(futuros):
+            deslocamento = futuros[futuro]
+            try:
+                blocos_da_pagina, url_pagina = futuro.result()
+            except requests.exceptions.RequestException as e:
+                falhas.append({"info": f"A página {deslocamento + 1} de resultados não pôde ser carregada: {e}"})
+                continue
+            ao_progredir(f"Página {deslocamento + 1} carregada.")
+            restantes = max_resultados - deslocamento * por_pagina
+            resultados_da_pagina = [
+                res for res in _resultados_dos_blocos_html(blocos_da_pagina[:restantes], deslocamento * por_pagina + 1,
+                                                           url_pagina)
+                if res.texto not in textos_vistos
+            ]
+            textos_vistos.update(res.texto for res in resultados_da_pagina)
+            if resultados_da_pagina:
+                yield resultados_da_pagina
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    if falhas:
+        yield falhas
+
+
+def iterar_jurisprudencia_tjgo(termo_pesquisa, max_resultados=3, navegador=None, modo_rapido=False, backend="auto",
+                               ao_progredir=None):
+    """
+    Busca jurisprudência no site do TJGO, gerando os resultados página a página
+    (listas de Decisao, com avisos e erros como dicts) à medida que ficam prontos, até
+    'max_resultados'.
+    backend: "http" (requisição direta), "selenium" (navegador) ou "auto" (HTTP, com o
+    Selenium como fallback quando o HTTP é detectado como quebrado). Uma resposta HTTP sem
+    resultados também passa pelo Selenium, mas só desliga o HTTP se o Selenium encontrar
+    decisões (senão era apenas uma busca sem resultados).
+    'navegador' pode ser um WebDriver já aberto ou uma função que o retorna; neste caso
+    ela só é chamada se o Selenium for de fato necessário.
+    'ao_progredir(mensagem)' é chamado a cada etapa da busca (para feedback de progresso).
+    """
+    global _http_indisponivel_ate
+    ao_progredir = ao_progredir or (lambda mensagem: None)
+    inicio = time.perf_counter()
+    backend_usado = None
+    http_sem_resultados = False
+
+    if backend == "http" or (backend == "auto" and time.time() >= _http_indisponivel_ate):
+        ao_progredir("Consultando o TJGO diretamente (HTTP)...")
+        paginas = iterar_jurisprudencia_http(termo_pesquisa, max_resultados, ao_progredir)
+        try:
+            primeira_pagina = next(paginas)
+        except HttpSemResultados as e:
+            if backend == "http":
+                backend_usado = "http"
+                yield [{"info": f"Nenhum resultado encontrado para: '{termo_pesquisa}'"}]
+            else:
+                http_sem_resultados = True
+                print(f"[jurisprudencia] backend HTTP sem resultados ({e}); conferindo com o Selenium.",
+                      file=sys.stderr)
+                ao_progredir("Nenhum resultado na consulta direta; conferindo com o navegador.")
+        except BackendHttpIndisponivel as e:
+            if backend == "http":
+                backend_usado = "http"
+                yield [{"erro_geral": f"Erro durante a busca: {str(e)}"}]
+            else:
+                _http_indisponivel_ate = time.time() + HTTP_PAUSA_APOS_FALHA_S
+                print(f"[jurisprudencia] backend HTTP indisponível ({e}); usando Selenium.", file=sys.stderr)
+                ao_progredir("Consulta direta indisponível; usando o navegador.")
+        else:
+            backend_usado = "http"
+            yield primeira_pagina
+            yield from paginas
+
+    if backend_usado is None:
+        backend_usado = "selenium rápido" if modo_rapido else "selenium"
+        selenium_encontrou = False
+        for pagina in iterar_jurisprudencia_selenium(termo_pesquisa, max_resultados, navegador, modo_rapido,
+                                                     ao_progredir):
+            selenium_encontrou = selenium_encontrou or any(isinstance(res, Decisao) for res in pagina)
+            yield pagina
+        if http_sem_resultados and selenium_encontrou:
+            # O navegador achou decisões onde o HTTP não viu nenhum bloco: o HTTP está quebrado
+            _http_indisponivel_ate = time.time() + HTTP_PAUSA_APOS_FALHA_S
+            print("[jurisprudencia] backend HTTP não encontrou resultados que o Selenium encontrou; "
+                  "usando só o Selenium por enquanto.", file=sys.stderr)
+
+    # Latência por busca (stderr, para não interferir no JSON de stdout)
+    print(f"[jurisprudencia] '{termo_pesquisa}' ({backend_usado}): {time.perf_counter() - inicio:.2f}s", file=sys.stderr)
+
+
+def buscar_jurisprudencia_tjgo(termo_pesquisa, max_resultados=3, navegador=None, modo_rapido=False, backend="auto"):
+    """
+    Busca jurisprudência no site do TJGO e retorna os primeiros 'max_resultados'
+    (percorrendo quantas páginas forem necessárias). Parâmetros como em iterar_jurisprudencia_tjgo.
+    """
+    return [
+        res
+        for pagina in iterar_jurisprudencia_tjgo(termo_pesquisa, max_resultados, navegador, modo_rapido, backend)
+        for res in pagina
+    ]
+
+
+def mesclar_resultados_lote(resultados_por_termo):
+    """
+    Junta os resultados de vários termos em uma única lista ranqueada: decisões repetidas
+    (mesmo texto, ignorando espaços) aparecem uma vez só, com a lista de termos que as
+    encontraram. Decisões encontradas por mais termos vêm primeiro; no empate, a de melhor
+    posição na busca original. Avisos e erros de cada termo vão para o final como "info".
+    """
+    decisoes = {}
+    avisos = []
+    for termo, resultados in resultados_por_termo.items():
+        for posicao, res in enumerate(resultados, 1):
+            if not isinstance(res, Decisao):
+                mensagem = next((valor for chave, valor in res.items() if chave.startswith("erro") or chave == "info"), None)
+                if mensagem:
+                    avisos.append({"info": f"'{termo}': {mensagem}"})
+                continue
+            decisao = decisoes.setdefault(" ".join(res.texto.split()), {
+                "resultado": res, "termos": [], "melhor_posicao": posicao, "ordem": len(decisoes)})
+            if termo not in decisao["termos"]:
+                decisao["termos"].append(termo)
+            decisao["melhor_posicao"] = min(decisao["melhor_posicao"], res.id if res.id is not None else posicao)
+
+    ranqueadas = sorted(decisoes.values(), key=lambda d: (-len(d["termos"]), d["melhor_posicao"], d["ordem"]))
+    # Os campos estruturados da decisão são mantidos; o trecho só vale para a busca de origem
+    return [
+        decisao["resultado"].substituir(id=indice + 1, termos=decisao["termos"], trecho=None)
+        for indice, decisao in enumerate(ranqueadas)
+    ] + avisos
+
+
+def buscar_jurisprudencia_lote(termos, max_resultados=3, concorrencia=4, **kwargs):
+    """
+    Busca vários termos em paralelo (no máximo 'concorrencia' ao mesmo tempo) e retorna
+    o resultado mesclado por mesclar_resultados_lote. Os demais argumentos são
+    repassados a buscar_jurisprudencia_tjgo.
+    """
+    termos_unicos = list(dict.fromkeys(termo.strip() for termo in termos if termo.strip()))
+    resultados_por_termo = {}
+    with ThreadPoolExecutor(max_workers=max(1, concorrencia)) as executor:
+        futuros = {
+            executor.submit(buscar_jurisprudencia_tjgo, termo, max_resultados, **kwargs): termo
+            for termo in termos_unicos
+        }
+        for futuro in as_completed(futuros):
+            termo = futuros[futuro]
+            try:
+                resultados_por_termo[termo] = futuro.result()
+            except Exception as e:
+                resultados_por_termo[termo] = [{"erro_geral": f"Erro durante a busca: {str(e)}"}]
+    # Mantém a ordem do arquivo de termos para que o desempate seja determinístico
+    return mesclar_resultados_lote({termo: resultados_por_termo[termo] for termo in termos_unicos})
+
+
+def _resultados_da_pagina_selenium(navegador, limite, primeiro_id, modo_rapido):
+    """Lê até 'limite' blocos de resultado da página aberta no navegador."""
+    resultados = []
+    if modo_rapido:
+        blocos = navegador.execute_script(SCRIPT_TEXTOS_RESULTADOS, limite) or []
+        for indice, bloco in enumerate(blocos):
+            texto_do_bloco = bloco.get("texto") or ""
+            if not texto_do_bloco.strip():
+                texto_do_bloco = "Conteúdo do bloco não pôde ser extraído ou estava vazio."
+            resultados.append(Decisao.do_texto(primeiro_id + indice, texto_do_bloco, bloco.get("link")))
+    else:
+        blocos_de_resultado = navegador.find_elements(By.CLASS_NAME, "search-result")
+        for indice, bloco_individual in enumerate(blocos_de_resultado[:limite]):
+            try:
+                texto_do_bloco = bloco_individual.text
+                if not texto_do_bloco.strip(): # Verifica se o texto não está vazio
+                    texto_do_bloco = "Conteúdo do bloco não pôde ser extraído ou estava vazio."
+
+                ancoras = bloco_individual.find_elements(By.CSS_SELECTOR, "a[href]")
+                link = ancoras[0].get_attribute("href") if ancoras else None
+                resultados.append(Decisao.do_texto(primeiro_id + indice, texto_do_bloco, link))
+            except Exception as e:
+                resultados.append({"id": primeiro_id + indice, "erro": f"Erro ao processar bloco {primeiro_id + indice}: {str(e)}", "texto": ""})
+    return resultados
+
+
+def _ir_para_proxima_pagina_selenium(navegador):
+    """Avança para a próxima página de resultados. Retorna False se não houver paginação."""
+    primeiro_bloco = navegador.find_elements(By.CLASS_NAME, "search-result")[0]
+    if not navegador.execute_script(SCRIPT_PROXIMA_PAGINA, CAMPO_PAGINA_ATUAL):
+        return False
+    WebDriverWait(navegador, 20).until(EC.staleness_of(primeiro_bloco))
+    return True
+
+
+def iterar_jurisprudencia_selenium(termo_pesquisa, max_resultados=3, navegador=None, modo_rapido=False,
+                                   ao_progredir=None):
+    """
+    Busca jurisprudência no TJGO controlando o Chrome, gerando uma lista de resultados
+    por página (as páginas são percorridas em sequência na mesma aba).
+    Se 'navegador' for informado, ele é reutilizado e não é encerrado ao final.
+    No modo rápido o texto de todos os blocos é lido com um único execute_script.
+    """
+    ao_progredir = ao_progredir or (lambda mensagem: None)
+    navegador_proprio = navegador is None
+    try:
+        if navegador_proprio:
+            navegador = criar_navegador(modo_rapido)
+        elif callable(navegador):
+            navegador = navegador()
     except Exception as e:
-        return [{"erro_driver": f"Falha ao iniciar o WebDriver: {str(e)}"}]
+        yield [{"erro_driver": f"Falha ao iniciar o WebDriver: {str(e)}"}]
+        return
 
-    resultados_finais = []
     try:
-        navegador.get("https://projudi.tjgo.jus.br/ConsultaJurisprudencia")
+        navegador.get(URL_CONSULTA_JURISPRUDENCIA)
 
         # Espera o campo de texto estar presente e visível
         campo_pesquisa_elemento = WebDriverWait(navegador, 10).until(
             EC.visibility_of_element_located((By.ID, "Texto"))
         )
         campo_pesquisa_elemento.send_keys(termo_pesquisa)
-        time.sleep(0.5) # Pequena pausa após digitar
+        # Confirma que o termo foi digitado por completo antes de submeter
+        WebDriverWait(navegador, 5).until(
+            lambda driver: campo_pesquisa_elemento.get_attribute("value") == termo_pesquisa
+        )
 
         # Espera o botão estar clicável
         botao_elemento = WebDriverWait(navegador, 10).until(
@@ -44,47 +482,182 @@ def buscar_jurisprudencia_tjgo(termo_pesquisa, max_resultados=3):
         )
         # Tenta clicar via JavaScript se o clique normal falhar ou para garantir visibilidade
         navegador.execute_script("arguments[0].scrollIntoView(true);", botao_elemento)
-        time.sleep(0.5) # Pequena pausa após scroll
-        botao_elemento.click()
+        WebDriverWait(navegador, 5).until(EC.element_to_be_clickable(botao_elemento)).click()
 
-        # Espera os resultados aparecerem (aqui um exemplo, pode precisar de ajuste)
-        WebDriverWait(navegador, 20).until(
-            EC.presence_of_all_elements_located((By.CLASS_NAME, "search-result"))
-        )
-        time.sleep(1) # Dá um tempo extra para o conteúdo carregar completamente
+        total_entregue = 0
+        textos_vistos = set()
+        pagina_atual = 1
+        while total_entregue < max_resultados:
+            # Espera os resultados aparecerem (aqui um exemplo, pode precisar de ajuste)
+            try:
+                WebDriverWait(navegador, 20).until(
+                    EC.presence_of_all_elements_located((By.CLASS_NAME, "search-result"))
+                )
+            except TimeoutException:
+                if total_entregue == 0:
+                    raise
+                break  # Páginas seguintes sem resultados: fim da paginação
+            # Em vez de uma pausa fixa, espera a lista de resultados parar de crescer
+            aguardar_contagem_estavel(navegador, "search-result")
 
-        blocos_de_resultado = navegador.find_elements(By.CLASS_NAME, "search-result")
-
-        if blocos_de_resultado:
-            for indice, bloco_individual in enumerate(blocos_de_resultado[:max_resultados]):
-                try:
-                    # Scroll para o elemento para garantir que está "visível" para o Selenium
-                    # navegador.execute_script("arguments[0].scrollIntoView({block: 'center', behavior: 'auto'});", bloco_individual)
-                    # time.sleep(0.2) # Pausa para o scroll
+            resultados_da_pagina = [
+                res for res in _resultados_da_pagina_selenium(
+                    navegador, max_resultados - total_entregue, total_entregue + 1, modo_rapido)
+                if not isinstance(res, Decisao) or res.texto not in textos_vistos
+            ]
+            if not resultados_da_pagina:
+                break  # Página vazia ou repetida
+            textos_vistos.update(res.texto for res in resultados_da_pagina if isinstance(res, Decisao))
+            total_entregue += len(resultados_da_pagina)
+            yield resultados_da_pagina
 
-                    texto_do_bloco = bloco_individual.text
-                    if not texto_do_bloco.strip(): # Verifica se o texto não está vazio
-                        texto_do_bloco = "Conteúdo do bloco não pôde ser extraído ou estava vazio."
+            if total_entregue >= max_resultados:
+                break
+            pagina_atual += 1
+            ao_progredir(f"Abrindo a página {pagina_atual} de resultados...")
+            if not _ir_para_proxima_pagina_selenium(navegador):
+                break
 
-                    resultados_finais.append({"id": indice + 1, "texto": texto_do_bloco})
-                except Exception as e:
-                    resultados_finais.append({"id": indice + 1, "erro": f"Erro ao processar bloco {indice + 1}: {str(e)}", "texto": ""})
-        else:
-            resultados_finais.append({"info": f"Nenhum resultado encontrado para: '{termo_pesquisa}'"})
+        if total_entregue == 0:
+            yield [{"info": f"Nenhum resultado encontrado para: '{termo_pesquisa}'"}]
 
     except Exception as e:
-        resultados_finais.append({"erro_geral": f"Erro durante a busca: {str(e)}"})
+        yield [{"erro_geral": f"Erro durante a busca: {str(e)}"}]
+    finally:
+        if navegador_proprio:
+            navegador.quit()
+
+
+def evento_do_resultado(res):
+    """Converte um item da lista de resultados em um evento do protocolo NDJSON."""
+    if isinstance(res, Decisao):
+        return {"tipo": "resultado", "resultado": res.para_dict()}
+    for chave, valor in res.items():
+        if chave.startswith("erro_"):
+            return {"tipo": "erro", "chave": chave, "mensagem": valor}
+    if "info" in res:
+        return {"tipo": "info", "mensagem": res["info"]}
+    return {"tipo": "resultado", "resultado": res}
+
+
+def emitir_eventos_busca(termo_pesquisa, max_resultados, emitir, **kwargs):
+    """
+    Executa a busca emitindo eventos NDJSON à medida que ocorrem, via 'emitir(evento)':
+    {"tipo": "resultado", "resultado": {...}} - um por decisão, assim que é lida
+    {"tipo": "progresso", "mensagem": ..., "recebidos": n}
+    {"tipo": "info", "mensagem": ...} / {"tipo": "erro", "chave": "erro_...", "mensagem": ...}
+    {"tipo": "fim", "total": n, "duracao_s": s} - sempre o último evento
+    Os demais argumentos são repassados a iterar_jurisprudencia_tjgo.
+    """
+    inicio = time.perf_counter()
+    total = 0
+
+    def progresso(mensagem):
+        emitir({"tipo": "progresso", "mensagem": mensagem, "recebidos": total})
+
+    if not termo_pesquisa:
+        emitir({"tipo": "erro", "chave": "erro_interno", "mensagem": "Nenhum termo de busca fornecido."})
+    else:
+        for pagina in iterar_jurisprudencia_tjgo(termo_pesquisa, max_resultados, ao_progredir=progresso, **kwargs):
+            for res in pagina:
+                evento = evento_do_resultado(res)
+                if evento["tipo"] == "resultado":
+                    total += 1
+                emitir(evento)
+    emitir({"tipo": "fim", "total": total, "duracao_s": round(time.perf_counter() - inicio, 3)})
+
+
+def executar_worker(modo_rapido=False, backend="auto"):
+    """
+    Modo worker: atende buscas pela entrada padrão e mantém o Chrome aberto entre
+    elas (o Chrome só é iniciado quando o backend Selenium é de fato usado).
+    Protocolo: uma requisição JSON por linha em stdin ({"termo": ..., "max_resultados": ...}).
+    Para cada requisição, o worker escreve em stdout os eventos NDJSON de
+    emitir_eventos_busca, terminando sempre com {"tipo": "fim", ...}.
+    Comandos: {"comando": "ping"} responde {"ok": bool}; {"comando": "sair"} encerra o worker.
+    """
+    navegador = None
+
+    def obter_navegador():
+        nonlocal navegador
+        # Recria o Chrome se a sessão anterior morreu (crash, OOM, etc.)
+        if navegador is not None and not navegador_saudavel(navegador):
+            try:
+                navegador.quit()
+            except Exception:
+                pass
+            navegador = None
+        if navegador is None:
+            navegador = criar_navegador(modo_rapido)
+        return navegador
+
+    def responder(mensagem):
+        sys.stdout.write(json.dumps(mensagem, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+
+    try:
+        for linha in sys.stdin:
+            linha = linha.strip()
+            if not linha:
+                continue
+            try:
+                requisicao = json.loads(linha)
+            except json.JSONDecodeError:
+                responder({"tipo": "erro", "chave": "erro_interno", "mensagem": f"Requisição inválida: {linha}"})
+                responder({"tipo": "fim", "total": 0, "duracao_s": 0})
+            else:
+                if requisicao.get("comando") == "sair":
+                    break
+                if requisicao.get("comando") == "ping":
+                    # Health check: o worker responde e informa se o Chrome (se aberto) ainda responde
+                    responder({"ok": navegador is None or navegador_saudavel(navegador)})
+                    continue
+                emitir_eventos_busca(requisicao.get("termo", ""), requisicao.get("max_resultados", 3), responder,
+                                     navegador=obter_navegador, modo_rapido=modo_rapido, backend=backend)
     finally:
-        navegador.quit()
+        if navegador is not None:
+            navegador.quit()
 
-    return resultados_finais
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        termo = sys.argv[1]
-        resultados = buscar_jurisprudencia_tjgo(termo)
+    parser = argparse.ArgumentParser(description="Busca de jurisprudência no TJGO.")
+    parser.add_argument("termo", nargs="?", help="Termo de busca")
+    parser.add_argument("--worker", action="store_true", help="Mantém o Chrome aberto e atende buscas via stdin/stdout")
+    parser.add_argument("--rapido", action="store_true", help="Modo rápido: sem imagens/CSS e extração em lote")
+    parser.add_argument("--backend", choices=BACKENDS, default="auto",
+                        help="http (sem navegador), selenium ou auto (HTTP com fallback para Selenium)")
+    parser.add_argument("--max-resultados", type=int, default=3,
+                        help="Quantidade de decisões a retornar (percorre quantas páginas forem necessárias)")
+    parser.add_argument("--ndjson", action="store_true",
+                        help="Emite um evento JSON por linha (resultados, progresso, erros) à medida que ocorrem")
+    parser.add_argument("--lote", metavar="ARQUIVO",
+                        help="Arquivo com um termo por linha; os termos são buscados em paralelo e mesclados")
+    parser.add_argument("--concorrencia", type=int, default=4, help="Máximo de termos buscados ao mesmo tempo no lote")
+    parser.add_argument("--parquet", metavar="ARQUIVO",
+                        help="Também grava as decisões encontradas em formato colunar (Parquet)")
+    args = parser.parse_args()
+
+    if args.worker:
+        executar_worker(modo_rapido=args.rapido, backend=args.backend)
+    elif args.lote:
+        with open(args.lote, encoding="utf-8") as arquivo_termos:
+            termos_lote = arquivo_termos.read().splitlines()
+        resultados = buscar_jurisprudencia_lote(termos_lote, args.max_resultados, args.concorrencia,
+                                                modo_rapido=args.rapido, backend=args.backend)
+        print(json.dumps(resultados_para_dicts(resultados), ensure_ascii=False))
+        if args.parquet:
+            exportar_parquet(decisoes_dos_resultados(resultados), args.parquet)
+    elif args.ndjson:
+        emitir_eventos_busca(args.termo, args.max_resultados,
+                             lambda evento: print(json.dumps(evento, ensure_ascii=False), flush=True),
+                             modo_rapido=args.rapido, backend=args.backend)
+    elif args.termo:
+        resultados = buscar_jurisprudencia_tjgo(args.termo, args.max_resultados, modo_rapido=args.rapido,
+                                                backend=args.backend)
         # Imprime o resultado como JSON para ser capturado pelo script principal
-        print(json.dumps(resultados, ensure_ascii=False))
+        print(json.dumps(resultados_para_dicts(resultados), ensure_ascii=False))
+        if args.parquet:
+            exportar_parquet(decisoes_dos_resultados(resultados), args.parquet)
     else:
         # Erro se nenhum termo for passado via linha de comando
-        print(json.dumps([{"erro": "Nenhum termo de busca fornecido."}], ensure_ascii=False))
\ No newline at end of file
+        print(json.dumps([{"erro": "Nenhum termo de busca fornecido."}], ensure_ascii=False))
@@ -0,0 +1,214 @@
+# limites_groq.py
+import collections
+import itertools
+import re
+import threading
+import time
+from cliente_http import segundos_retry_after
+
+# Prioridades (menor sai primeiro) entre chamadas que disputam os limites do mesmo modelo
+PRIORIDADE_CHAT = 0  # Respostas que o usuário está esperando na tela
+PRIORIDADE_LOTE = 1  # Partes de fatos extensos analisadas em paralelo
+PRIORIDADE_TRANSCRICAO = 2
+
+# Requisições por minuto por modelo (a Groq só informa o limite diário nos cabeçalhos).
+# O limite de tokens por minuto vem dos cabeçalhos da primeira resposta: antes disso, não há
+# como saber o plano da chave, e um valor fixo baixo atrasaria à toa a primeira rajada.
+REQUISICOES_POR_MINUTO_PADRAO = 30
+REQUISICOES_POR_MINUTO = {
+    "whisper-large-v3-turbo": 20,
+    "whisper-large-v3": 20,
+}
+ESPERA_MAXIMA_POR_CICLO_S = 1.0  # Reavalia a fila pelo menos uma vez por segundo
+
+PADRAO_DURACAO_RESET = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+SEGUNDOS_POR_UNIDADE = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def segundos_reset(valor):
+    """Interpreta os cabeçalhos x-ratelimit-reset-* da Groq ('7.66s', '2m59.56s', '250ms')."""
+    partes = PADRAO_DURACAO_RESET.findall(valor or "")
+    if not partes:
+        return None
+    return sum(float(numero) * SEGUNDOS_POR_UNIDADE[unidade] for numero, unidade in partes)
+
+
+def _inteiro(valor):
+    try:
+        return int(float(valor))
+    except (TypeError, ValueError):
+        return None
+
+
+class BaldeTokens:
+    """Token bucket: 'capacidade' unidades, reabastecidas continuamente a 'por_segundo'."""
+
+    def __init__(self, capacidade, por_segundo):
+        self.capacidade = capacidade
+        self.por_segundo = por_segundo
+        self.nivel = float(capacidade)
+        self.atualizado_em = time.monotonic()
+
+    def _reabastecer(self, agora):
+        self.nivel = min(self.capacidade, self.nivel + (agora - self.atualizado_em) * self.por_segundo)
+        self.atualizado_em = agora
+
+    def espera(self, quantidade, agora):
+        """Segundos até haver 'quantidade' no balde (pedidos maiores que a capacidade esperam o balde cheio)."""
+        self._reabastecer(agora)
+        falta = min(quantidade, self.capacidade) - self.nivel
+        return max(0.0, falta / self.por_segundo)
+
+    def consumir(self, quantidade, agora):
+        self._reabastecer(agora)
+        self.nivel -= min(quantidade, self.capacidade)
+
+    def sincronizar(self, capacidade, restante, agora):
+        # A Groq informa o saldo real, que já inclui o consumo de outras instâncias com a mesma chave
+        self.capacidade = capacidade
+        self.por_segundo = capacidade / 60
+        self.nivel = float(min(restante, capacidade))
+        self.atualizado_em = agora
+
+
+class _LimitesModelo:
+    def __init__(self, requisicoes_por_minuto):
+        self.requisicoes = BaldeTokens(requisicoes_por_minuto, requisicoes_por_minuto / 60)
+        self.tokens = None  # Criado quando a Groq informar o limite (o Whisper não é limitado por tokens)
+        self.bloqueado_ate = 0.0  # 429 ou cota diária esgotada: ninguém sai antes disso
+
+    def espera(self, tokens, agora):
+        esperas = [self.bloqueado_ate - agora, self.requisicoes.espera(1, agora)]
+        if self.tokens is not None:
+            esperas.append(self.tokens.espera(tokens, agora))
+        return max(0.0, *esperas)
+
+    def consumir(self, tokens, agora):
+        self.requisicoes.consumir(1, agora)
+        if self.tokens is not None:
+            self.tokens.consumir(tokens, agora)
+
+    def intervalo_medio(self):
+        return 1 / self.requisicoes.por_segundo
+
+
+class AgendadorGroq:
+    """
+    Fila única do processo para as chamadas à Groq (a chave é compartilhada por todas as
+    sessões). Mantém por modelo baldes de requisições e de tokens por minuto, ajustados
+    pelos cabeçalhos x-ratelimit-* de cada resposta, e libera as chamadas no ritmo que a
+    Groq aceita em vez de deixá-las receber 429. Entre chamadas do mesmo modelo, sai
+    primeiro a de menor prioridade e, dentro da prioridade, as sessões se alternam
+    (enfileiramento justo por número de chamadas).
+    """
+
+    def __init__(self, requisicoes_por_minuto=REQUISICOES_POR_MINUTO,
+                 requisicoes_por_minuto_padrao=REQUISICOES_POR_MINUTO_PADRAO):
+        self.requisicoes_por_minuto = requisicoes_por_minuto
+        self.requisicoes_por_minuto_padrao = requisicoes_por_minuto_padrao
+        self._condicao = threading.Condition()
+        self._modelos = {}
+        self._filas = collections.defaultdict(list)  # modelo -> [(prioridade, tempo virtual, sequência)]
+        self._sequencia = itertools.count()
+        self._tempo_virtual = collections.defaultdict(float)  # modelo -> tempo virtual da última chamada liberada
+        self._tempo_virtual_sessao = {}  # (modelo, sessão) -> tempo virtual da última chamada da sessão
+        self._contadores = collections.defaultdict(lambda: {"liberadas": 0, "atrasadas": 0, "espera_total_s": 0.0})
+
+    def _limites(self, modelo):
+        if modelo not in self._modelos:
+            self._modelos[modelo] = _LimitesModelo(
+                self.requisicoes_por_minuto.get(modelo, self.requisicoes_por_minuto_padrao))
+        return self._modelos[modelo]
+
+    def aguardar_vez(self, modelo, tokens=0, prioridade=PRIORIDADE_CHAT, sessao=None, ao_aguardar=None):
+        """
+        Bloqueia até a chamada poder ser feita sem estourar os limites do modelo.
+        'ao_aguardar(espera_estimada_s, chamadas_na_frente)' é chamado (fora do lock) enquanto
+        a chamada espera e uma última vez com (0, 0) quando ela é liberada.
+        """
+        inicio = time.monotonic()
+        with self._condicao:
+            fila = self._filas[modelo]
+            tempo_virtual = max(self._tempo_virtual_sessao.get((modelo, sessao), 0.0), self._tempo_virtual[modelo]) + 1
+            self._tempo_virtual_sessao[(modelo, sessao)] = tempo_virtual
+            pedido = (prioridade, tempo_virtual, next(self._sequencia))
+            fila.append(pedido)
+        esperou = False
+        try:
+            while True:
+                with self._condicao:
+                    agora = time.monotonic()
+                    limites = self._limites(modelo)
+                    espera_modelo = limites.espera(tokens, agora)
+                    na_frente = sum(outro < pedido for outro in fila)
+                    if na_frente == 0 and espera_modelo <= 0:
+                        limites.consumir(tokens, agora)
+                        fila.remove(pedido)
+                        self._tempo_virtual[modelo] = max(self._tempo_virtual[modelo], tempo_virtual)
+                        contadores = self._contadores[modelo]
+                        contadores["liberadas"] += 1
+                        if esperou:
+                            contadores["atrasadas"] += 1
+                            contadores["espera_total_s"] += agora - inicio
+                        self._condicao.notify_all()
+                        break
+                    espera_estimada = espera_modelo + na_frente * limites.intervalo_medio()
+                esperou = True
+                if ao_aguardar is not None:
+                    ao_aguardar(espera_estimada, na_frente)
+                with self._condicao:
+                    self._condicao.wait(timeout=max(0.05, min(espera_modelo or ESPERA_MAXIMA_POR_CICLO_S,
+                                                              ESPERA_MAXIMA_POR_CICLO_S)))
+        finally:
+            with self._condicao:
+                if pedido in fila:  # Interrompida (ex.: rerun do Streamlit): não segura a fila
+                    fila.remove(pedido)
+                    self._condicao.notify_all()
+        if esperou and ao_aguardar is not None:
+            ao_aguardar(0.0, 0)
+
+    def registrar_resposta(self, modelo, cabecalhos, status_code):
+        """Ajusta os limites do modelo com os cabeçalhos x-ratelimit-* (e Retry-After, em um 429)."""
+        agora = time.monotonic()
+        with self._condicao:
+            limites = self._limites(modelo)
+            limite_tokens = _inteiro(cabecalhos.get("x-ratelimit-limit-tokens"))
+            restante_tokens = _inteiro(cabecalhos.get("x-ratelimit-remaining-tokens"))
+            if limite_tokens and restante_tokens is not None:
+                if limites.tokens is None:
+                    limites.tokens = BaldeTokens(limite_tokens, limite_tokens / 60)
+                limites.tokens.sincronizar(limite_tokens, restante_tokens, agora)
+            # O limite de requisições informado é diário: só importa quando acaba
+            if _inteiro(cabecalhos.get("x-ratelimit-remaining-requests")) == 0:
+                reset = segundos_reset(cabecalhos.get("x-ratelimit-reset-requests"))
+                if reset:
+                    limites.bloqueado_ate = max(limites.bloqueado_ate, agora + reset)
+            if status_code == 429:
+                espera = (segundos_retry_after(cabecalhos.get("Retry-After"))
+                          or segundos_reset(cabecalhos.get("x-ratelimit-reset-tokens"))
+                          or limites.intervalo_medio())
+                limites.bloqueado_ate = max(limites.bloqueado_ate, agora + espera)
+            self._condicao.notify_all()
+
+    def estatisticas(self):
+        """Por modelo: chamadas liberadas, quantas precisaram esperar, espera média e fila atual."""
+        with self._condicao:
+            return {
+                modelo: {**contadores, "na_fila": len(self._filas[modelo]),
+                         "espera_media_s": contadores["espera_total_s"] / contadores["atrasadas"]
+                         if contadores["atrasadas"] else 0.0}
+                for modelo, contadores in self._contadores.items()
+            }
+
+
+_agendador_groq = None
+_agendador_groq_lock = threading.Lock()
+
+
+def obter_agendador_groq():
+    """Instância única de AgendadorGroq para o processo (todas as sessões do Streamlit)."""
+    global _agendador_groq
+    with _agendador_groq_lock:
+        if _agendador_groq is None:
+            _agendador_groq = AgendadorGroq()
+        return _agendador_groq